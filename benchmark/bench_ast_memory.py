@@ -0,0 +1,110 @@
+# - bench_ast_memory.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Benchmark the memory of the ASTs kept resident for the whole codebase - - - - - - - #
+import gc
+import sys
+import tempfile
+import tracemalloc
+from collections import Counter
+from function_tag import list_func_files
+from utils.parser.expr_class import ExprAST, BlockAST, PrototypeAST
+from utils.parser.var_usage_analysis import analyze_var_usage
+from utils.parser.parse_cache import PARSE_CACHE
+from benchmark.gen_synthetic import FEATURE_FOLDER, gen_codebase, add_codebase_args
+
+
+class DictNode:
+    """AST node keeping its attributes in a __dict__, the layout without __slots__"""
+
+
+def get_AST_nodes():
+    """Return the live AST nodes"""
+    return [
+        obj
+        for obj in gc.get_objects()
+        if isinstance(obj, (ExprAST, BlockAST, PrototypeAST))
+    ]
+
+
+def get_slot_names(cls):
+    """Return the names of the slots declared by the class and its bases"""
+    names = []
+    for base in cls.__mro__:
+        slots = base.__dict__.get("__slots__", ())
+        names.extend([slots] if isinstance(slots, str) else slots)
+    return [name for name in names if name not in ("__dict__", "__weakref__")]
+
+
+def node_layout_memory(nodes: list):
+    """
+    Return the bytes of the AST nodes themselves, without the values they refer to,
+    with __slots__ and as baseline when their attributes are kept in a __dict__.
+    """
+    slots_memory = 0
+    dict_memory = 0
+    for node in nodes:
+        slots_memory += sys.getsizeof(node)
+        if hasattr(node, "__dict__"):
+            slots_memory += sys.getsizeof(node.__dict__)
+
+        baseline = DictNode()
+        for name in get_slot_names(type(node)):
+            if hasattr(node, name):
+                setattr(baseline, name, getattr(node, name))
+        dict_memory += sys.getsizeof(baseline) + sys.getsizeof(baseline.__dict__)
+    return slots_memory, dict_memory
+
+
+def bench_ast_memory(code_dir: str, sub_folders: list):
+    """
+    Parse the variable usage of every file of the codebase and keep the results
+    resident, as the parse cache does for the later stages.
+
+    Returns:
+        record (dict): number of files and AST nodes, resident and peak traced memory
+        in bytes, and the bytes of the nodes with __slots__ against the baseline of
+        the same nodes keeping their attributes in a __dict__.
+    """
+    func_files = list_func_files(code_dir, sub_folders + ["."])
+    PARSE_CACHE.clear()
+    gc.collect()
+    base_ids = {id(obj) for obj in get_AST_nodes()}
+
+    tracemalloc.start()
+    resident = [analyze_var_usage(func_file) for func_file, _ in func_files]
+    gc.collect()
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    new_nodes = [obj for obj in get_AST_nodes() if id(obj) not in base_ids]
+    nodes = Counter(type(obj).__name__ for obj in new_nodes)
+    num_nodes = len(new_nodes)
+    slots_memory, dict_memory = node_layout_memory(new_nodes)
+    del resident, new_nodes
+    PARSE_CACHE.clear()
+    return {
+        "num_files": len(func_files),
+        "num_nodes": num_nodes,
+        "resident_memory": memory,
+        "peak_memory": peak,
+        "bytes_per_node": memory / max(num_nodes, 1),
+        "node_memory": slots_memory,
+        "dict_node_memory": dict_memory,
+        "node_memory_ratio": slots_memory / max(dict_memory, 1),
+        "nodes": dict(nodes.most_common()),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    add_codebase_args(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as code_dir:
+        config = gen_codebase(
+            code_dir, args.funcs, args.depth, args.fanout, args.lines, args.loops
+        )
+        record = bench_ast_memory(code_dir, [FEATURE_FOLDER])
+    print(json.dumps({"config": config, **record}, indent=4))
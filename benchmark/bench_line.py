@@ -0,0 +1,58 @@
+# - bench_line.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Benchmark the scaling of the code line splitter over the file length - - - - - - - - #
+import time
+from utils.parser.line import generate_valid_code_line
+
+
+def generate_matlab_code(num_lines: int):
+    """
+    Generate a Matlab function with num_lines lines mixing code, comments and
+    continuity lines.
+    """
+    code_line = ["function y = bench_func(x)"]
+    for ind in range(num_lines - 2):
+        if ind % 10 == 0:
+            code_line.append("% comment line " + str(ind))
+        elif ind % 10 == 1:
+            code_line.append(f"v{ind} = feat(x, ...")
+        elif ind % 10 == 2:
+            code_line.append(f"    {ind}); % continued line")
+        else:
+            code_line.append(f"v{ind} = x(1:{ind}) .* {ind};")
+    code_line.append("end")
+    return "\n".join(code_line) + "\n"
+
+
+def bench_line_split(num_lines: int, repeat=3):
+    """Return the best time over repeat runs to split the file into code lines"""
+    file_contents = generate_matlab_code(num_lines)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in generate_valid_code_line(file_contents):
+            pass
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        required=False,
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 50000, 100000, 200000],
+        help="Number of lines of the generated files",
+    )
+    parser.add_argument(
+        "--repeat", required=False, type=int, default=3, help="Repeat times per size"
+    )
+    args = parser.parse_args()
+
+    print(f"{'lines':>10} {'time (s)':>12} {'us/line':>10}")
+    for num_lines in args.sizes:
+        elapsed = bench_line_split(num_lines, args.repeat)
+        print(f"{num_lines:>10} {elapsed:>12.4f} {elapsed / num_lines * 1e6:>10.3f}")
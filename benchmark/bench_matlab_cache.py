@@ -0,0 +1,160 @@
+# - bench_matlab_cache.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Benchmark the runtime of the generated Matlab code under Octave - - - - - - - - - - #
+import io
+import os
+import sys
+import shutil
+import tempfile
+import contextlib
+import subprocess
+from function_tag import list_func_files, tag_func_files
+from function_call_analysis import CallGraph, call_analysis, save_cnt_graph
+from save_vars_matlab import VarSave_EmotionalClassification
+from utils.adapter.gen_matlab_save_code import SAVE_MODES
+from benchmark.gen_synthetic import (
+    ROOT_FUNC,
+    FEATURE_FOLDER,
+    gen_codebase,
+    add_codebase_args,
+)
+
+DRIVER = "ace_bench_driver"
+
+
+def gen_driver_code(num_funcs, num_signals, num_masks, signal_len):
+    """
+    Generate the Matlab script that evaluates num_masks random masks on each of the
+    num_signals signals and prints the elapsed time. The generated root function
+    keys the cache on the signal, so the driver does not reset it.
+    """
+    return f"""addpath(genpath(pwd));
+rand('state', 0);
+signal = sin((1:{signal_len}) / 10);
+masks = rand({num_masks}, {num_funcs}) > 0.5;
+tic;
+for s = 1:{num_signals}
+    for m = 1:{num_masks}
+        feats = {ROOT_FUNC}(signal + s, masks(m, :));
+    end
+end
+fprintf('%.6f\\n', toc);
+"""
+
+
+def gen_codebase_with_cache(code_dir, new_code_dir, save_mode, index_mode):
+    """Run the pipeline on code_dir and write the generated codebase to new_code_dir"""
+    shutil.copytree(code_dir, new_code_dir)
+    sub_folders = [FEATURE_FOLDER]
+    with contextlib.redirect_stdout(io.StringIO()):
+        tag_data = tag_func_files(list_func_files(code_dir, sub_folders + ["."]))
+        root_node = call_analysis(
+            code_dir,
+            ROOT_FUNC + ".m",
+            tag_data,
+            call_graph=CallGraph(),
+            sub_func_folders=sub_folders,
+        )
+        strategy = VarSave_EmotionalClassification(
+            code_dir,
+            ROOT_FUNC,
+            sub_folders,
+            save_cnt_graph(root_node, {}),
+            new_code_dir,
+            index_mode,
+            save_mode,
+            key_input=True,
+        )
+        strategy.select_examine_subfuncs()
+        strategy.process_examined_subfuncs(["plomb"])
+    return len(strategy.save_var_list)
+
+
+def run_octave(octave, code_dir, driver_code):
+    """Run the driver script in code_dir and return the time it prints"""
+    with open(os.path.join(code_dir, DRIVER + ".m"), "w") as file:
+        file.write(driver_code)
+    result = subprocess.run(
+        [octave, "--quiet", "--eval", DRIVER],
+        cwd=code_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Octave failed in '{code_dir}':\n{result.stderr}")
+    return float(result.stdout.strip().split("\n")[-1])
+
+
+def bench_matlab_cache(
+    octave, code_dir, num_funcs, num_signals, num_masks, signal_len, index_mode
+):
+    """
+    Time the original codebase and the codebases generated in each save mode.
+
+    Returns:
+        record (dict): mode : number of saved variables and runtime in seconds.
+    """
+    record = {}
+    driver_args = (num_funcs, num_signals, num_masks, signal_len)
+    record["original"] = {
+        "time": run_octave(octave, code_dir, gen_driver_code(*driver_args))
+    }
+
+    for save_mode in SAVE_MODES:
+        new_code_dir = code_dir + "_" + save_mode
+        num_vars = gen_codebase_with_cache(
+            code_dir, new_code_dir, save_mode, index_mode
+        )
+        record[save_mode] = {
+            "num_vars": num_vars,
+            "time": run_octave(octave, new_code_dir, gen_driver_code(*driver_args)),
+        }
+    return record
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    add_codebase_args(parser)
+    parser.add_argument(
+        "--signals", required=False, type=int, default=5, help="Number of signals"
+    )
+    parser.add_argument(
+        "--masks", required=False, type=int, default=20, help="Masks per signal"
+    )
+    parser.add_argument(
+        "--signallen", required=False, type=int, default=1000, help="Signal length"
+    )
+    parser.add_argument(
+        "--indexmode",
+        required=False,
+        default="strcmp",
+        help="Index lookup of the generated code, see save_vars_matlab.py",
+    )
+    parser.add_argument(
+        "--octave",
+        required=False,
+        default=shutil.which("octave-cli") or shutil.which("octave"),
+        help="Path to the Octave executable",
+    )
+    args = parser.parse_args()
+
+    if args.octave is None:
+        sys.exit("Octave is not found, install it or pass its path with --octave")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        code_dir = os.path.join(tmp_dir, "synthetic")
+        config = gen_codebase(
+            code_dir, args.funcs, args.depth, args.fanout, args.lines, args.loops
+        )
+        record = bench_matlab_cache(
+            args.octave,
+            code_dir,
+            args.funcs,
+            args.signals,
+            args.masks,
+            args.signallen,
+            args.indexmode,
+        )
+    print(json.dumps({"config": config, **record}, indent=4))
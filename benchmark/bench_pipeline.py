@@ -0,0 +1,183 @@
+# - bench_pipeline.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Benchmark the runtime and peak memory of each stage of the pipeline - - - - - - - - #
+import io
+import os
+import time
+import platform
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+from function_tag import list_func_files, tag_func_files
+from function_call_analysis import CallGraph, call_analysis, save_cnt_graph
+from save_vars_matlab import VarSave_EmotionalClassification
+from utils.parser.var_usage_analysis import analyze_var_usage
+from utils.parser.parse_cache import PARSE_CACHE
+from benchmark.gen_synthetic import (
+    ROOT_FUNC,
+    FEATURE_FOLDER,
+    gen_codebase,
+    add_codebase_args,
+)
+
+
+def stage_tag(code_dir: str, sub_folders: list):
+    return tag_func_files(list_func_files(code_dir, sub_folders + ["."]))
+
+
+def stage_call_analysis(code_dir: str, root_func: str, tag_data: dict, sub_folders):
+    root_node = call_analysis(
+        code_dir,
+        root_func + ".m",
+        tag_data,
+        call_graph=CallGraph(),
+        sub_func_folders=sub_folders,
+    )
+    return save_cnt_graph(root_node, {})
+
+
+def stage_var_usage(func_files: list):
+    for func_file, _ in func_files:
+        analyze_var_usage(func_file)
+
+
+def stage_save_vars(
+    code_dir: str, root_func: str, call_graph: dict, sub_folders, new_code_dir
+):
+    strategy = VarSave_EmotionalClassification(
+        code_dir, root_func, sub_folders, call_graph, new_code_dir
+    )
+    strategy.select_examine_subfuncs()
+    strategy.process_examined_subfuncs(["plomb"])
+
+
+def measure(stage, repeat=1, memory=True):
+    """
+    Run the stage with an empty parse cache, as each stage runs in its own process in
+    the pipeline.
+
+    Returns:
+        result: return value of the stage.
+        record (dict): best runtime in seconds and peak traced memory in bytes.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        PARSE_CACHE.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = stage()
+            best = min(best, time.perf_counter() - start)
+    record = {"time": best}
+
+    # trace the memory in a separate run as tracing slows down the stage
+    if memory:
+        PARSE_CACHE.clear()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            stage()
+        record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, record
+
+
+def get_version():
+    """Return the git commit of the benchmarked code if available"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def bench_pipeline(code_dir, root_func, sub_folders, repeat=1, memory=True):
+    """Benchmark the stages of the pipeline on the codebase in code_dir"""
+    stages = {}
+    func_files = list_func_files(code_dir, sub_folders + ["."])
+
+    tag_data, stages["tag_func"] = measure(
+        lambda: stage_tag(code_dir, sub_folders), repeat, memory
+    )
+    call_graph, stages["call_analysis"] = measure(
+        lambda: stage_call_analysis(code_dir, root_func, tag_data, sub_folders),
+        repeat,
+        memory,
+    )
+    _, stages["analyze_var_usage"] = measure(
+        lambda: stage_var_usage(func_files), repeat, memory
+    )
+    with tempfile.TemporaryDirectory() as new_code_dir:
+        for sub_folder in sub_folders:
+            os.makedirs(os.path.join(new_code_dir, sub_folder), exist_ok=True)
+        _, stages["save_vars_in_matlab"] = measure(
+            lambda: stage_save_vars(
+                code_dir, root_func, call_graph, sub_folders, new_code_dir
+            ),
+            repeat,
+            memory,
+        )
+
+    return {"num_files": len(func_files), "num_nodes": len(call_graph), **stages}
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--codedir",
+        required=False,
+        default=None,
+        help="Benchmark an existing codebase instead of a generated one",
+    )
+    parser.add_argument(
+        "--rootfunc", required=False, default=ROOT_FUNC, help="Root function name"
+    )
+    parser.add_argument(
+        "--subfolder",
+        required=False,
+        default=[],
+        action="append",
+        help="Relative path to the sub folders in the code directory",
+    )
+    add_codebase_args(parser)
+    parser.add_argument(
+        "--repeat", required=False, type=int, default=1, help="Repeat times per stage"
+    )
+    parser.add_argument(
+        "--nomemory", action="store_true", help="Do not trace the peak memory"
+    )
+    parser.add_argument(
+        "--output", required=False, default=None, help="Path of the json result"
+    )
+    args = parser.parse_args()
+
+    result = {
+        "version": get_version(),
+        "python": platform.python_version(),
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.codedir is None:
+            code_dir = os.path.join(tmp_dir, "synthetic")
+            result["config"] = gen_codebase(
+                code_dir, args.funcs, args.depth, args.fanout, args.lines, args.loops
+            )
+            sub_folders = [FEATURE_FOLDER]
+        else:
+            code_dir = args.codedir
+            result["config"] = {"codedir": code_dir}
+            sub_folders = args.subfolder
+
+        result["stages"] = bench_pipeline(
+            code_dir, args.rootfunc, sub_folders, args.repeat, not args.nomemory
+        )
+
+    json_result = json.dumps(result, indent=4)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            outfile.write(json_result)
+    print(json_result)
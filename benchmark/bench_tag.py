@@ -0,0 +1,58 @@
+# - bench_tag.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Benchmark tagging the function declaration of files with long bodies - - - - - - - - #
+import os
+import time
+import tempfile
+from function_tag import tag_func
+from utils.parser.parse_cache import PARSE_CACHE
+from benchmark.bench_line import generate_matlab_code
+
+
+def write_matlab_file(folder: str, num_lines: int):
+    """Write a Matlab function with a continued declaration and a long body"""
+    file_dir = os.path.join(folder, f"bench_func_{num_lines}.m")
+    header = "%{\nbenchmark function\n%}\nfunction [y, z] = bench_func(x, ...\n    mask)\n"
+    body = generate_matlab_code(num_lines).split("\n", 1)[1]
+    with open(file_dir, "w") as file:
+        file.write(header + body)
+    return file_dir
+
+
+def bench_tag(file_dir: str, header_only: bool, repeat=3):
+    """Return the best time over repeat runs to tag the file"""
+    best = float("inf")
+    for _ in range(repeat):
+        PARSE_CACHE.clear()
+        start = time.perf_counter()
+        tag_func(file_dir, header_only=header_only)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        required=False,
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="Number of lines of the generated files",
+    )
+    parser.add_argument(
+        "--repeat", required=False, type=int, default=3, help="Repeat times per size"
+    )
+    args = parser.parse_args()
+
+    print(f"{'lines':>10} {'full parse (s)':>16} {'header only (s)':>16}")
+    with tempfile.TemporaryDirectory() as folder:
+        for num_lines in args.sizes:
+            file_dir = write_matlab_file(folder, num_lines)
+            assert tag_func(file_dir, header_only=True) == tag_func(
+                file_dir, header_only=False
+            )
+            full = bench_tag(file_dir, False, args.repeat)
+            header = bench_tag(file_dir, True, args.repeat)
+            print(f"{num_lines:>10} {full:>16.4f} {header:>16.6f}")
@@ -0,0 +1,225 @@
+# - gen_synthetic.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Generate synthetic feature extraction codebases shaped like toy_example - - - - - - - #
+import os
+import shutil
+
+ROOT_FUNC = "ROOT_extract_bio_features"
+FEATURE_FOLDER = "compute_features"
+
+
+def gen_filler_lines(num_lines: int, in_var="x", indent=""):
+    """Generate num_lines computation lines, each reusing the previous result"""
+    code_line = []
+    pre_var = in_var
+    for ind in range(num_lines):
+        var = f"t{ind + 1}"
+        if ind % 4 == 0:
+            code_line.append(f"{indent}{var} = {pre_var} .* {ind + 2};")
+        elif ind % 4 == 1:
+            code_line.append(f"{indent}{var} = sqrt({pre_var}.*conj({pre_var}));")
+        elif ind % 4 == 2:
+            code_line.append(f"{indent}{var} = {pre_var} / norm({pre_var});")
+        else:
+            code_line.append(f"{indent}{var} = abs({pre_var}) + {in_var};")
+        pre_var = var
+    return code_line, pre_var
+
+
+def gen_loop_lines(loop_nesting: int, in_var: str, out_var="acc"):
+    """Generate loop_nesting nested for loops accumulating the input"""
+    if loop_nesting <= 0:
+        return [f"{out_var} = 0;"]
+
+    code_line = [f"{out_var} = 0;"]
+    for level in range(loop_nesting):
+        code_line.append("    " * level + f"for i{level + 1} = 1:{level + 2}")
+    code_line.append(
+        "    " * loop_nesting + f"{out_var} = {out_var} + {in_var}(i{loop_nesting});"
+    )
+    for level in range(loop_nesting - 1, -1, -1):
+        code_line.append("    " * level + "end")
+    return code_line
+
+
+def gen_feature(feat_ind: int, lines: int, loop_nesting: int):
+    """Generate the leaf feature function featN"""
+    code_line = [f"function y = feat{feat_ind}(x)"]
+    filler, last_var = gen_filler_lines(lines)
+    code_line += filler
+    code_line += gen_loop_lines(loop_nesting, last_var)
+    code_line.append(f"y = median({last_var}) + acc;")
+    code_line.append("end")
+    return "\n".join(code_line) + "\n"
+
+
+def gen_dispatcher(func_name: str, children: list, lines: int, leaf=False):
+    """
+    Generate a mask-gated compute_* function.
+
+    Args:
+        func_name (str): name of the function.
+        children (list): (function name, mask start, mask end) of the children, the
+            mask indices are relative to the mask of this function.
+        lines (int): number of computation lines before the dispatch.
+        leaf (bool, optional): whether the children are feature functions gated by
+            one mask bit each. Defaults to False.
+    """
+    code_line = [f"function output = {func_name}(x, mask)", "output = [];"]
+    filler, last_var = gen_filler_lines(lines)
+    code_line += filler
+
+    for child, start, end in children:
+        # the saved variables are global, keep their names unique in the codebase
+        out_var = "v_" + child
+        if leaf:
+            code_line.append(f"if mask({start})")
+            code_line.append(f"    {out_var} = {child}({last_var});")
+            code_line.append(f"    output = [output, {out_var}];")
+            code_line.append("end")
+        else:
+            code_line.append(f"{out_var} = {child}({last_var}, mask({start}:{end}));")
+            code_line.append(f"output = [output, {out_var}];")
+        code_line.append("")
+    code_line.append("end")
+    return "\n".join(code_line) + "\n"
+
+
+def split_range(num: int, parts: int):
+    """Split range(num) into at most parts contiguous non-empty chunks"""
+    parts = max(1, min(parts, num))
+    chunks = []
+    start = 0
+    for ind in range(parts):
+        stop = start + (num - start) // (parts - ind)
+        chunks.append((start, stop))
+        start = stop
+    return chunks
+
+
+def gen_codebase(
+    code_dir: str,
+    num_funcs=16,
+    depth=2,
+    fanout=2,
+    lines=10,
+    loop_nesting=1,
+):
+    """
+    Generate a synthetic feature extraction codebase shaped like toy_example: a ROOT
+    function that filters the signal and dispatches slices of the mask to compute_*
+    functions, which dispatch to compute_features/featN.m leaves.
+
+    Args:
+        code_dir (str): folder of the generated codebase, overwritten if exists.
+        num_funcs (int, optional): number of feature functions (mask bits).
+        depth (int, optional): levels of compute_* functions between ROOT and leaves.
+        fanout (int, optional): maximum number of children per function.
+        lines (int, optional): computation lines per function.
+        loop_nesting (int, optional): nesting of the loops in the feature functions.
+
+    Returns:
+        config (dict): parameters of the generated codebase.
+    """
+    if os.path.isdir(code_dir):
+        shutil.rmtree(code_dir)
+    os.makedirs(os.path.join(code_dir, FEATURE_FOLDER))
+
+    def write(func_name, code):
+        with open(os.path.join(code_dir, func_name + ".m"), "w") as file:
+            file.write(code)
+
+    num_dispatchers = 0
+
+    # build the dispatchers top-down, each owns a contiguous range of feature indices
+    def build(path: str, feat_range: tuple, level: int):
+        nonlocal num_dispatchers
+        num_dispatchers += 1
+        name = f"compute_{path}_feats"
+        start, stop = feat_range
+        if level == depth:
+            children = [
+                (f"feat{ind + 1}", ind - start + 1, ind - start + 1)
+                for ind in range(start, stop)
+            ]
+            write(name, gen_dispatcher(name, children, lines, leaf=True))
+            return
+
+        children = []
+        for ind, (sub_start, sub_stop) in enumerate(split_range(stop - start, fanout)):
+            child_path = f"{path}_{ind + 1}"
+            build(child_path, (start + sub_start, start + sub_stop), level + 1)
+            children.append((f"compute_{child_path}_feats", sub_start + 1, sub_stop))
+        write(name, gen_dispatcher(name, children, lines))
+
+    # the root dispatches to the top level compute_* functions
+    root_code = [
+        f"function feats = {ROOT_FUNC}(signal, mask)",
+        "freq_signal = fft(signal);",
+        "filter_sig = filter_input(freq_signal);",
+    ]
+    feat_vars = []
+    for ind, (start, stop) in enumerate(split_range(num_funcs, fanout)):
+        child = f"compute_{ind + 1}_feats"
+        build(str(ind + 1), (start, stop), 1)
+        root_code.append(
+            f"feat_{ind + 1} = {child}(filter_sig, mask({start + 1}:{stop}));"
+        )
+        feat_vars.append(f"feat_{ind + 1}")
+    root_code.append("feats = [" + ", ".join(feat_vars) + "];")
+    root_code.append("end")
+    write(ROOT_FUNC, "\n".join(root_code) + "\n")
+
+    filter_code = ["function y = filter_input(x)", "a = [2,3];", "b = [0.1, 0.2];"]
+    filter_code.append("y = filter(a, b, x);")
+    filter_code.append("end")
+    write("filter_input", "\n".join(filter_code) + "\n")
+
+    for ind in range(num_funcs):
+        write(
+            os.path.join(FEATURE_FOLDER, f"feat{ind + 1}"),
+            gen_feature(ind + 1, lines, loop_nesting),
+        )
+
+    return {
+        "num_funcs": num_funcs,
+        "depth": depth,
+        "fanout": fanout,
+        "lines": lines,
+        "loop_nesting": loop_nesting,
+        "num_files": num_funcs + num_dispatchers + 2,
+    }
+
+
+def add_codebase_args(parser):
+    """Add the arguments of the synthetic codebase to the argument parser"""
+    parser.add_argument(
+        "--funcs", type=int, default=16, help="Number of feature functions"
+    )
+    parser.add_argument(
+        "--depth", type=int, default=2, help="Levels of compute_* functions"
+    )
+    parser.add_argument(
+        "--fanout", type=int, default=2, help="Maximum children per function"
+    )
+    parser.add_argument(
+        "--lines", type=int, default=10, help="Computation lines per function"
+    )
+    parser.add_argument(
+        "--loops", type=int, default=1, help="Loop nesting in the feature functions"
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--codedir", required=True, help="Path to the generated code directory"
+    )
+    add_codebase_args(parser)
+    args = parser.parse_args()
+
+    config = gen_codebase(
+        args.codedir, args.funcs, args.depth, args.fanout, args.lines, args.loops
+    )
+    print(f"Generate {config['num_files']} files in {args.codedir} =====")
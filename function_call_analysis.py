@@ -2,11 +2,21 @@
 # - Parse the Matlab code and analyze the sub-function call pattern - - - - - - - - - - #
 import os
 import re
-from utils.parser.line import generate_valid_code_line
+import json
+from collections import deque
 from utils.visualization import call_graph_viz
+from utils.callgraph_format import COMPACT_GRAPH_EXT, write_compact_graph
+from utils.parser.lexer import (
+    IDENT,
+    OPERATOR,
+    SEPARATOR,
+    SPACE,
+    split_assignment,
+    tokenize,
+)
 from utils.parser.parse_expr import parse_nested_expr
-from utils.parser.expr_class import CallExprAST
-from function_tag import remove_cmt_paragraph
+from utils.parser.expr_class import CallExprAST, BinaryExprAST, NumberExprAST
+from utils.parser.parse_cache import PARSE_CACHE, get_valid_code_lines
 
 
 class FunctionCall:
@@ -23,8 +33,9 @@ class FunctionCall:
         self.cnt_vars_parents = {}
         self.cnt_vars_children = {}
 
-        self.child_nodes = []
-        self.parent_nodes = []
+        # adjacency indexed by the function name, kept in the call order
+        self.child_nodes = {}
+        self.parent_nodes = {}
 
     def add_child_node(self, child_func):
         """
@@ -32,10 +43,8 @@ class FunctionCall:
         Args:
             child_func: the child node
         """
-        for node in self.child_nodes:
-            if node.func_name == child_func.func_name:
-                return
-        self.child_nodes.append(child_func)
+        if child_func.func_name not in self.child_nodes:
+            self.child_nodes[child_func.func_name] = child_func
 
     def add_parent_node(self, parent_func):
         """
@@ -43,18 +52,45 @@ class FunctionCall:
         Args:
             parent_func: the parent node local_vars: internal variables
         """
-        for node in self.parent_nodes:
-            if node.func_name == parent_func.func_name:
-                return
-        self.parent_nodes.append(parent_func)
+        if parent_func.func_name not in self.parent_nodes:
+            self.parent_nodes[parent_func.func_name] = parent_func
 
 
-def function_called(func_name: str, callee: list, prefix="") -> None:
-    for func in callee:
-        if func.func_name == func_name:
-            return func
-        elif func.func_name == prefix + func_name:
-            return func
+class CallGraph:
+    """
+    CallGraph keeps the index of the function name to the FunctionCall node of every
+    function in the call graph.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.root = None
+
+    def get_node(self, func_name: str, prefix=""):
+        """Return the node of the function if it is in the graph, otherwise None"""
+        node = self.nodes.get(func_name)
+        if node is None and prefix:
+            node = self.nodes.get(prefix + func_name)
+        return node
+
+    def add_node(self, function: FunctionCall):
+        self.nodes[function.func_name] = function
+        if self.root is None:
+            self.root = function
+
+    def add_edge(self, parent_func: FunctionCall, child_func: FunctionCall):
+        parent_func.add_child_node(child_func)
+        child_func.add_parent_node(parent_func)
+
+    def __contains__(self, func_name: str):
+        return func_name in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def function_called(func_name: str, callee: CallGraph, prefix="") -> None:
+    return callee.get_node(func_name, prefix)
 
 
 def is_sub_func_called(func_name: str, call_pattern, sub_folders: list[str]):
@@ -85,25 +121,23 @@ def is_sub_func_called(func_name: str, call_pattern, sub_folders: list[str]):
 
 
 def call_analysis_code(
-    code_cont: str,
-    func_entity: FunctionCall,
+    code_lines: list,
     function_attributes: dict,
-    code_dir: str,
     sub_func_folders=[],
-    par_func_list=[],
 ):
     """
-    Analyze the variable usage in the function body
+    Analyze the user defined functions called in the function body
 
     Args:
-        code_cont (str): String body of the function
-        func_entity (FunctionCall): FunctionCall object of the function
+        code_lines (list): Valid code lines of the function body
         function_attributes (dict): Function attributes of generated by function_tag.py
-        code_dir (str): Directory of the code
         sub_func_folders (list, optional): Sub folders in root_dir that are used. Defaults to [].
-        par_func_list (list, optional): Parent function list. Defaults to [].
+
+    Returns:
+        sub_func_list (list): full names of the called functions in the call order
     """
-    for line in generate_valid_code_line(code_cont):
+    sub_func_list = []
+    for line in code_lines:
         # skip the function definition
         if line.strip().startswith("function"):
             continue
@@ -127,34 +161,151 @@ def call_analysis_code(
             if not sub_func_fullname:
                 continue
 
-            call_analysis(
-                code_dir,
-                sub_func_fullname + ".m",
-                function_attributes,
-                par_func_list,
-                parent_func=func_entity,
-                sub_func_folders=sub_func_folders,
-            )
+            sub_func_list.append(sub_func_fullname)
+
+    return sub_func_list
+
+
+def get_mask_range(arg, mask_name="mask"):
+    """
+    Return the (start, end) mask bits of the argument if it is a constant slice of the
+    mask, e.g. mask(1:3) or mask(4), None otherwise.
+    """
+    # without variable table, the slice of the mask is parsed as a call whose argument
+    # is the bit or the range of bits
+    if not isinstance(arg, CallExprAST) or arg.func_name != mask_name:
+        return None
+    if len(arg.args) != 1:
+        return None
+
+    index = arg.args[0]
+    if isinstance(index, NumberExprAST):
+        return int(index.value), int(index.value)
+    if (
+        isinstance(index, BinaryExprAST)
+        and index.op == ":"
+        and isinstance(index.left_op, NumberExprAST)
+        and isinstance(index.right_op, NumberExprAST)
+    ):
+        return int(index.left_op.value), int(index.right_op.value)
+    return None
+
+
+def get_mask_slices(
+    code_lines: list,
+    function_attributes: dict,
+    sub_func_folders=[],
+    mask_name="mask",
+):
+    """
+    Analyze the slices of the mask passed to the user defined functions, e.g.
+    "feat = compute_time_domain_feats(signal, mask(1:3))".
+
+    Args:
+        code_lines (list): Valid code lines of the function body
+        function_attributes (dict): Function attributes of generated by function_tag.py
+        sub_func_folders (list, optional): Sub folders in root_dir that are used. Defaults to [].
+        mask_name (str, optional): name of the mask variable. Defaults to "mask".
+
+    Returns:
+        mask_slices (list): (full name of the called function, start bit, end bit,
+        output assigned by the call) in the call order
+    """
+    mask_slices = []
+    for line in code_lines:
+        if line.strip().startswith("function"):
+            continue
+
+        result = re.split(r"(?<=[^<>=~])=(?![<>=~])", line)
+        if len(result) < 2 or result[1].find(mask_name + "(") == -1:
+            continue
+
+        rhs_ast = parse_nested_expr(result[1])
+        if not isinstance(rhs_ast, CallExprAST):
+            continue
+        sub_func_fullname = is_sub_func_called(
+            rhs_ast.func_name, function_attributes, sub_func_folders
+        )
+        if not sub_func_fullname:
+            continue
+
+        for arg in rhs_ast.args:
+            mask_range = get_mask_range(arg, mask_name)
+            if mask_range:
+                mask_slices.append((sub_func_fullname, *mask_range, result[0].strip()))
+
+    return mask_slices
+
+
+def get_output_concat(code_lines: list, output_name: str):
+    """
+    Return the names of the variables horizontally concatenated into the output, e.g.
+    ["time_feat", "freq_feat"] for "feats = [time_feat, freq_feat];".
+
+    Args:
+        code_lines (list): Valid code lines of the function body
+        output_name (str): name of the output variable of the function.
+
+    Returns:
+        concat (list): the concatenated variable names in order, None if the output
+        is not assigned once by the concatenation of variables.
+    """
+    concat = None
+    num_assigned = 0
+    for line in code_lines:
+        if line.strip().startswith("function"):
+            continue
+        result = split_assignment(line)
+        if result is None or result[0].strip() != output_name:
+            continue
+        num_assigned += 1
+
+        tokens = tokenize(result[1].strip().rstrip(";").strip())
+        if len(tokens) < 2 or tokens[0].text != "[" or tokens[-1].text != "]":
+            continue
+        inner = tokens[1:-1]
+        elements = (IDENT, SPACE, SEPARATOR)
+        separators = [token for token in inner if token.kind not in elements]
+        if all(token.kind == OPERATOR and token.text == "," for token in separators):
+            concat = [token.text for token in inner if token.kind == IDENT]
+
+    return concat if num_assigned == 1 else None
+
+
+def create_function_node(func_name: str, function_attributes: dict) -> FunctionCall:
+    """Create the FunctionCall object with the attributes tagged by function_tag.py"""
+    input_vars = []
+    output_vars = []
+    if func_name in function_attributes.keys():
+        input_vars = function_attributes[func_name]["input"]
+        output_vars = function_attributes[func_name]["output"]
+
+    return FunctionCall(func_name, input_vars, output_vars)
 
 
 def call_analysis(
     root_dir: str,
     file_name: str,
     function_attributes: dict,
-    visited_funcs=[],
+    call_graph=None,
     parent_func=None,
     sub_func_folders=[],
 ) -> FunctionCall:
     """
-    Create a FunctionCall object that connectthe function to its parent node if exists,
-    and analyze the variable usage in the function body.
-    Construct the function call graph by recursively calling the function.
+    Create a FunctionCall object that connect the function to its parent node if exists,
+    and construct the function call graph from it.
+
+    The graph is built with a worklist: every function file is read and analyzed once,
+    and a function called from several parents is represented by one shared node.
+    Recursive calls and call cycles are kept as edges to the existing node without
+    analyzing the function again.
 
     Args:
         root_dir (str): Root directory of the code
         file_name (str): File name of the function
         function_attributes (dict):Function attributes generated by function_tag.py
-        visited_funcs (list, optional): Pre_visited function list. Defaults to [].
+        call_graph (CallGraph, optional): Index of the analyzed functions, shared
+            between calls to build one graph. Defaults to None.
         parent_func (FunctionCall, optional): Callee function. Defaults to None.
         sub_func_folders (list, optional): Sub folders in root_dir that are used. Defaults to [].
 
@@ -164,50 +315,78 @@ def call_analysis(
     Returns:
         function: FunctionCall object
     """
-    try:
-        with open(os.path.join(root_dir, file_name), "r") as file:
-            # Read the contents of the file
-            file_contents = file.read()
-    except FileNotFoundError:
-        raise ValueError(
-            f"The file '{os.path.join(root_dir, file_name)}' was not found."
-        )
+    if call_graph is None:
+        call_graph = CallGraph()
 
-    # ignore the comments enclosed in %{ ... }%
-    file_contents = remove_cmt_paragraph(file_contents)
-
-    # initialize the function
-    input_vars = []
-    output_vars = []
-    if file_name[:-2] in function_attributes.keys():
-        input_vars = function_attributes[file_name[:-2]]["input"]
-        output_vars = function_attributes[file_name[:-2]]["output"]
-
-    function = FunctionCall(file_name[:-2], input_vars, output_vars)
-    # add the non-visited function to the function list
-    if not function_called(file_name[:-2], visited_funcs):
-        visited_funcs.append(function)
+    func_name = file_name[:-2]
+    function = call_graph.get_node(func_name)
+    worklist = deque()
+    if function is None:
+        function = create_function_node(func_name, function_attributes)
+        call_graph.add_node(function)
+        worklist.append(function)
 
     # connect the function to its parent node if exists
     if parent_func:
-        if function in parent_func.child_nodes:
-            return
-        else:
-            parent_func.add_child_node(function)
-            function.add_parent_node(parent_func)
-
-    call_analysis_code(
-        file_contents,
-        function,
-        function_attributes,
-        root_dir,
-        sub_func_folders,
-        visited_funcs,
-    )
+        call_graph.add_edge(parent_func, function)
+
+    while worklist:
+        cur_func = worklist.popleft()
+        cur_file = os.path.join(root_dir, cur_func.func_name + ".m")
+        try:
+            # code lines without the comments, parsed once per file
+            code_lines = get_valid_code_lines(cur_file)
+        except FileNotFoundError:
+            raise ValueError(f"The file '{cur_file}' was not found.")
+
+        for sub_func_name in call_analysis_code(
+            code_lines, function_attributes, sub_func_folders
+        ):
+            sub_func = call_graph.get_node(sub_func_name)
+            if sub_func is None:
+                sub_func = create_function_node(sub_func_name, function_attributes)
+                call_graph.add_node(sub_func)
+                worklist.append(sub_func)
+
+            call_graph.add_edge(cur_func, sub_func)
 
     return function
 
 
+def iter_cnt_graph(root_node: FunctionCall):
+    """
+    Traverse the function call graph in depth-first pre-order from the root node, each
+    node is visited once even if it is shared by several parents or in a cycle.
+
+    Args:
+        root_node (FunctionCall): FunctionCall object of the root node
+
+    Yields:
+        json_key (str), json_value (dict): function name and its json description
+    """
+    visited = set()
+    stack = [root_node]
+    while stack:
+        node = stack.pop()
+        if node.func_name in visited:
+            continue
+        visited.add(node.func_name)
+
+        json_value = {}
+        json_value["child_nodes"] = list(node.child_nodes.keys())
+        json_value["parent_nodes"] = list(node.parent_nodes.keys())
+        json_value["input"] = node.input_vars
+        json_value["output"] = node.output_vars
+        json_value["cnt_vars_parents"] = node.cnt_vars_parents
+        json_value["cnt_vars_children"] = node.cnt_vars_children
+        yield node.func_name, json_value
+
+        # push in reverse so that the children are visited in the call order
+        for child_node in reversed(node.child_nodes.values()):
+            if child_node.func_name not in visited:
+                stack.append(child_node)
+
+
 def save_cnt_graph(root_node: FunctionCall, json_map: dict):
     """
     Save the Function call graph to json format
@@ -219,35 +398,35 @@ def save_cnt_graph(root_node: FunctionCall, json_map: dict):
     Returns:
         json_map(dict): Visited function list
     """
-    json_key = root_node.func_name
-    json_value = {}
+    for json_key, json_value in iter_cnt_graph(root_node):
+        if json_key not in json_map:
+            json_map[json_key] = json_value
 
-    json_value["child_nodes"] = []
-    for child_func in root_node.child_nodes:
-        json_value["child_nodes"].append(child_func.func_name)
+    return json_map
 
-    json_value["parent_nodes"] = []
-    for parent_func in root_node.parent_nodes:
-        json_value["parent_nodes"].append(parent_func.func_name)
 
-    json_value["input"] = root_node.input_vars
-    json_value["output"] = root_node.output_vars
-    json_value["cnt_vars_parents"] = root_node.cnt_vars_parents
-    json_value["cnt_vars_children"] = root_node.cnt_vars_children
+def write_cnt_graph(root_node: FunctionCall, outfile, indent=4):
+    """
+    Write the Function call graph to the json file node by node without building the
+    complete json map, the output is the same as json.dump(save_cnt_graph(...)).
 
-    json_node = {json_key: json_value}
-    json_map = {**json_map, **json_node}
+    Args:
+        root_node (FunctionCall): FunctionCall object of the root node
+        outfile: opened file to write
+        indent (int, optional): indent of the json file. Defaults to 4.
+    """
+    prefix = " " * indent
+    separator = "{\n"
+    for json_key, json_value in iter_cnt_graph(root_node):
+        json_node = json.dumps(json_value, indent=indent).replace("\n", "\n" + prefix)
+        outfile.write(f"{separator}{prefix}{json.dumps(json_key)}: {json_node}")
+        separator = ",\n"
 
-    for child_node in root_node.child_nodes:
-        json_map = save_cnt_graph(child_node, json_map)
-
-    return json_map
+    outfile.write("{}" if separator == "{\n" else "\n}")
 
 
 if __name__ == "__main__":
     import argparse
-    import os
-    import json
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -265,7 +444,10 @@ if __name__ == "__main__":
         "--jsontag", required=True, help="Path to the function attributes file"
     )
     parser.add_argument(
-        "--outdir", required=True, help="Path to store the output json analysis file"
+        "--outdir",
+        required=True,
+        help="Path to store the output json analysis file, the compact binary format "
+        f"is used if it ends with {COMPACT_GRAPH_EXT}",
     )
     parser.add_argument(
         "--visualize",
@@ -274,7 +456,16 @@ if __name__ == "__main__":
         help="whether to visualize the call graph",
     )
 
+    parser.add_argument(
+        "--cachedir",
+        required=False,
+        default=None,
+        help="Directory to store the parse results for incremental re-runs",
+    )
     args = parser.parse_args()
+
+    if args.cachedir:
+        PARSE_CACHE.set_cache_dir(args.cachedir)
     visualize = int(args.visualize)
     folder = args.codedir
     json_tag = args.jsontag
@@ -286,13 +477,22 @@ if __name__ == "__main__":
     with open(json_tag, "r") as file:
         tag_data = json.load(file)
 
+    call_graph = CallGraph()
     root_node = call_analysis(
-        folder, root_file + ".m", tag_data, sub_func_folders=sub_func_folders
+        folder,
+        root_file + ".m",
+        tag_data,
+        call_graph=call_graph,
+        sub_func_folders=sub_func_folders,
     )
-    print("Call graph generation done =====\n")
+    print("Call graph generation done =====")
+    print(PARSE_CACHE.summary() + "\n")
 
     if visualize > 0:
         call_graph_viz(root_node,visualize, "test1")
-    json_file = save_cnt_graph(root_node, {})
-    with open(outdir, "w") as outfile:
-        json.dump(json_file, outfile, indent=4)
+    if outdir.endswith(COMPACT_GRAPH_EXT):
+        with open(outdir, "wb") as outfile:
+            write_compact_graph(iter_cnt_graph(root_node), outfile)
+    else:
+        with open(outdir, "w") as outfile:
+            write_cnt_graph(root_node, outfile)
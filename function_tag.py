@@ -1,10 +1,15 @@
+import os
+import multiprocessing
 from parse import parse
 import warnings
 from utils.parser.line import (
     generate_valid_code_line,
+    generate_valid_code_line_stream,
     remove_cmt_paragraph,
+    remove_cmt_paragraph_stream,
     remove_cmt_in_line,
 )
+from utils.parser.parse_cache import PARSE_CACHE
 
 
 # Remove leading and trailing whitespace
@@ -87,15 +92,8 @@ def get_function_attributes(expr: str, definition=False) -> None:
         return func_name, input_vars, output_vars
 
 
-# Tag the function attributes of a Matlab function file
-def tag_func(func_dir: str, prefix=""):
-    try:
-        with open(func_dir, "r") as file:
-            # Read the contents of the file
-            file_contents = file.read()
-    except FileNotFoundError:
-        print(f"The file '{func_dir}' was not found.")
-
+# Tag the function attributes of the content of a Matlab function file
+def tag_func_code(file_contents: str, func_dir=""):
     # ignore the comments enclosed in %{ ... }%
     file_contents = remove_cmt_paragraph(file_contents)
     if file_contents == "":
@@ -106,18 +104,102 @@ def tag_func(func_dir: str, prefix=""):
     for line in generate_valid_code_line(file_contents):
         attrs = get_function_attributes(line, definition=True)
         if attrs:
-            func_name, input_vars, output_vars = attrs
-            if prefix != "":
-                func_name = prefix + "/" + func_name
+            return attrs
+
+    return [""] * 3
 
-            return func_name, input_vars, output_vars
 
+# Tag the function attributes of a Matlab function file by reading the file
+# incrementally, stop as soon as the function declaration is parsed
+def tag_func_stream(func_dir: str):
+    with open(func_dir, "r") as file:
+        # ignore the comments enclosed in %{ ... }%
+        lines = remove_cmt_paragraph_stream(file)
+        is_empty = True
+        for line in generate_valid_code_line_stream(lines):
+            is_empty = False
+            attrs = get_function_attributes(line, definition=True)
+            if attrs:
+                return attrs
+
+    if is_empty:
+        warnings.warn("No function is found in {}".format(func_dir))
     return [""] * 3
 
 
+# Tag the function attributes of a Matlab function file
+def tag_func(func_dir: str, prefix="", header_only=True):
+    """
+    Tag the function name, input and output variables of a Matlab function file.
+
+    Args:
+        func_dir (str): path of the Matlab file.
+        prefix (str, optional): sub folder of the file. Defaults to "".
+        header_only (bool, optional): only read the file until the function
+            declaration. Otherwise the complete file is parsed through the parse cache.
+            Defaults to True.
+    """
+    try:
+        if header_only:
+            func_name, input_vars, output_vars = tag_func_stream(func_dir)
+        else:
+            func_name, input_vars, output_vars = PARSE_CACHE.get(
+                func_dir,
+                "func_attr",
+                lambda content: tag_func_code(content, func_dir),
+                persist=True,
+            )
+    except FileNotFoundError:
+        print(f"The file '{func_dir}' was not found.")
+        return [""] * 3
+
+    if func_name and prefix != "":
+        func_name = prefix + "/" + func_name
+
+    return func_name, input_vars, output_vars
+
+
+# List the Matlab function files to tag in a deterministic order
+def list_func_files(code_dir: str, subdir: list):
+    func_files = []
+    for sub_folder in subdir:
+        for file_dir in sorted(os.listdir(os.path.join(code_dir, sub_folder))):
+            if not file_dir.endswith(".m"):
+                continue
+
+            if sub_folder == ".":
+                cur_file = os.path.join(code_dir, file_dir)
+                prefix = ""
+            else:
+                cur_file = os.path.join(code_dir, sub_folder, file_dir)
+                prefix = sub_folder
+            func_files.append((cur_file, prefix))
+
+    return func_files
+
+
+# Tag the function attributes of the files, in a process pool if jobs > 1
+def tag_func_files(func_files: list, jobs=1):
+    if jobs > 1 and len(func_files) > 1:
+        with multiprocessing.Pool(min(jobs, len(func_files))) as pool:
+            # starmap keeps the order of func_files, so the result is identical to the
+            # serial run
+            tags = pool.starmap(tag_func, func_files)
+    else:
+        tags = [tag_func(cur_file, prefix=prefix) for cur_file, prefix in func_files]
+
+    # merge the tags in one step, the later file overrides the same function name
+    function_attributes = {}
+    for func_name, input_vars, output_vars in tags:
+        if not func_name:
+            continue
+        function_attributes[func_name] = {"input": input_vars, "output": output_vars}
+
+    return function_attributes
+
+
 if __name__ == "__main__":
     import argparse
-    import os
     import json
 
     parser = argparse.ArgumentParser()
@@ -132,6 +214,13 @@ if __name__ == "__main__":
     parser.add_argument(
         "--outdir", required=True, help="Path to store the output json analysis file"
     )
+    parser.add_argument(
+        "--jobs",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of processes to tag the files",
+    )
     args = parser.parse_args()
 
     code_dir = args.codedir
@@ -140,25 +229,9 @@ if __name__ == "__main__":
 
     subdir.append(".")  # add current directory
 
-    function_attributes = {}
-
-    for sub_folder in subdir:
-        for file_dir in os.listdir(os.path.join(code_dir, sub_folder)):
-            if not file_dir.endswith(".m"):
-                continue
-
-            if sub_folder == ".":
-                cur_file = os.path.join(code_dir, file_dir)
-                prefix = ""
-            else:
-                cur_file = os.path.join(code_dir, sub_folder, file_dir)
-                prefix = sub_folder
-
-            func_name, input_vars, output_vars = tag_func(cur_file, prefix=prefix)
-            if not func_name:
-                continue
-            func_attr = {func_name: {"input": input_vars, "output": output_vars}}
-            function_attributes = {**function_attributes, **func_attr}
+    function_attributes = tag_func_files(
+        list_func_files(code_dir, subdir), args.jobs
+    )
     print("Tag user-define function done =====\n")
 
     with open(out_dir, "w") as outfile:
@@ -6,15 +6,75 @@ from utils.parser.expr_class import FunctionAST
 from utils.adapter.save_strategy import (
     is_once_called_func,
     select_non_loop_used_vars,
+    select_call_vars,
     VariableSaveStrategy,
 )
-from utils.adapter.gen_matlab_save_code import save_vars_in_matlab
+from utils.adapter.gen_matlab_save_code import (
+    SAVE_MODES,
+    DISK_CACHE_DIR,
+    save_vars_in_matlab,
+    gen_cache_code,
+    instrument_calls_in_matlab,
+    gen_log_cost_code,
+    gen_evaluate_masks_code,
+    gen_cache_key_code,
+    key_root_in_matlab,
+    get_cache_name,
+)
+from utils.adapter.cost_model import load_cost_model, select_by_cost
+from utils.parser.parse_cache import PARSE_CACHE, get_valid_code_lines
+from utils.callgraph_format import load_call_graph
+from function_call_analysis import get_mask_slices, get_output_concat
+
+
+# ways to look up the index of a variable in the control vector:
+# strcmp: get_var_index compares the name with every saved variable
+# map: get_var_index looks up a persistent containers.Map
+# inline: the constant indices are inlined at the call sites, get_var_index as map
+INDEX_MODES = ["strcmp", "map", "inline"]
 
 
 class VarSave_EmotionalClassification(VariableSaveStrategy):
-    def __init__(self, folder, rootfile, subfolders, call_pattern):
+    def __init__(
+        self,
+        folder,
+        rootfile,
+        subfolders,
+        call_pattern,
+        new_code_dir,
+        index_mode="strcmp",
+        save_mode="global",
+        cost_model=None,
+        memory_budget=None,
+        disk_dir=DISK_CACHE_DIR,
+        disk_budget=None,
+        key_input=False,
+        mask_name="mask",
+    ):
         super().__init__(folder, rootfile, subfolders)
         self.call_pattern = call_pattern
+        self.new_code_dir = new_code_dir
+        if index_mode not in INDEX_MODES:
+            raise ValueError(f"Unknown index mode '{index_mode}'.")
+        self.index_mode = index_mode
+        if save_mode not in SAVE_MODES:
+            raise ValueError(f"Unknown save mode '{save_mode}'.")
+        self.save_mode = save_mode
+        # cache every selected variable if no cost model
+        self.cost_model = cost_model
+        self.memory_budget = memory_budget
+        # folder and size in bytes of the disk cache in the disk save mode
+        self.disk_dir = disk_dir
+        self.disk_budget = disk_budget
+        # key the cache on the root inputs with ace_cache_begin in the root function
+        self.key_input = key_input
+        # name of the root input selecting the features
+        self.mask_name = mask_name
+        self.save_var_list = []
+        # loop indexed variable : name of the loop variable, saved per iteration
+        self.loop_vars = {}
+        # variable : number of values saved, None if the loop iterations are unknown
+        self.save_counts = {}
 
     def select_examine_subfuncs(self):
         """Select the sub-functions that need to be examined"""
@@ -32,69 +92,245 @@ class VarSave_EmotionalClassification(VariableSaveStrategy):
 
     def process_examined_subfuncs(self, system_func_list=[]):
         full_save_var_list = []
+        func_save_vars = []
         for func in self.process_func:
             # save variables computed by the system function which takes on large overhead
             save_var_list = self.select_save_vars(func, system_func_list)
             full_save_var_list.extend(save_var_list)
+            func_save_vars.append((func, save_var_list))
+
+        # keep the variables worth caching, the memory budget is shared by all functions
+        if self.cost_model is not None:
+            full_save_var_list = select_by_cost(
+                full_save_var_list,
+                self.cost_model,
+                self.memory_budget,
+                self.save_counts,
+            )
+            selected = set(full_save_var_list)
+            func_save_vars = [
+                (func, [var for var in save_var_list if var in selected])
+                for func, save_var_list in func_save_vars
+            ]
 
-            self.generate_save_code(func, save_var_list)
+        # the indices are known once the variables of all functions are selected
+        var_index = None
+        if self.index_mode == "inline":
+            var_index = get_var_indices(full_save_var_list)
+        for func, save_var_list in func_save_vars:
+            self.generate_save_code(func, save_var_list, var_index)
+        self.key_root(func_save_vars)
 
-        # generate init globals file
-        self.init_globals(full_save_var_list)
+        self.save_var_list = full_save_var_list
+        if self.save_mode != "global":
+            self.init_cache(full_save_var_list)
+        else:
+            # generate init globals file
+            self.init_globals(full_save_var_list)
+        self.gen_cache_key(full_save_var_list)
+        self.gen_evaluate_masks()
+
+    def instrument_examined_subfuncs(
+        self, system_func_list=[], log_file="ace_profile.log"
+    ):
+        """
+        Generate the code profiling every call site of the user functions of the call
+        graph and of system_func_list in the functions of the call graph, the runtime
+        and output size of each call are appended to log_file. Only the calls whose
+        outputs are assigned are profiled, not the calls nested in an expression.
+        """
+        call_funcs = list(self.call_pattern) + system_func_list
+        for func in self.call_pattern:
+            func_dir = os.path.join(self.folder, func + ".m")
+            if not os.path.isfile(func_dir):
+                continue
+            block, _, _ = analyze_var_usage(func_dir)
+            call_vars = select_call_vars(block, call_funcs, self.subfolders)
+            if len(call_vars) == 0:
+                continue
+
+            profile_code = instrument_calls_in_matlab(func_dir, call_vars)
+            gen_code = open(os.path.join(self.new_code_dir, func + ".m"), "wt")
+            gen_code.write(profile_code)
+            gen_code.close()
+
+        gen_code = open(os.path.join(self.new_code_dir, "ace_log_cost.m"), "wt")
+        gen_code.write(gen_log_cost_code(log_file))
+        gen_code.close()
 
     def init_globals(self, var_list):
         num_vars = len(var_list)
         init_matlab_code = f"global ctrl_vec;\n\n"
-        index_var_code = "function ind = get_var_index(var_name)\nind=0;\n"
         for ind, var in enumerate(var_list):
-            init_matlab_code = init_matlab_code + "global " + var.var_name + ";\n"
-
-            index_var_code = (
-                index_var_code
-                + f"if (strcmp(var_name, '{var.var_name}'))\n  ind={ind+1};\nend\n"
-            )
+            cache_name = get_cache_name(var.var_name, self.loop_vars.get(var))
+            init_matlab_code = init_matlab_code + "global " + cache_name + ";\n"
 
         # write the code into init_globals.m
-        gen_code = open(os.path.join(new_code_dir, "init_globals.m"), "wt")
+        gen_code = open(os.path.join(self.new_code_dir, "init_globals.m"), "wt")
         gen_code.write(init_matlab_code)
         gen_code.close()
 
-        # generate the index of the variables for the control vector
-        index_var_code = index_var_code + "end\n"
-        gen_code = open(os.path.join(new_code_dir, "get_var_index.m"), "wt")
+        self.gen_var_index(var_list)
+
+    def init_cache(self, var_list):
+        """Generate the cache handle class, its getter and init_cache.m"""
+        disk_dir = self.disk_dir if self.save_mode == "disk" else None
+        cache_files = gen_cache_code(len(var_list), disk_dir, self.disk_budget)
+        for file_name, cache_code in cache_files.items():
+            gen_code = open(os.path.join(self.new_code_dir, file_name), "wt")
+            gen_code.write(cache_code)
+            gen_code.close()
+
+        self.gen_var_index(var_list)
+
+    def gen_evaluate_masks(self):
+        """Generate evaluate_masks.m from the mask slices in the root function"""
+        root_dir = os.path.join(self.folder, self.rootfile + ".m")
+        code_lines = get_valid_code_lines(root_dir)
+        mask_slices = get_mask_slices(
+            code_lines, self.call_pattern, self.subfolders, self.mask_name
+        )
+        root_outputs = self.call_pattern.get(self.rootfile, {}).get("output", [])
+        output_concat = None
+        if len(root_outputs) == 1:
+            output_concat = get_output_concat(code_lines, root_outputs[0])
+        evaluate_code = gen_evaluate_masks_code(
+            self.rootfile, mask_slices, output_concat
+        )
+
+        gen_code = open(os.path.join(self.new_code_dir, "evaluate_masks.m"), "wt")
+        gen_code.write(evaluate_code)
+        gen_code.close()
+
+    def gen_cache_key(self, var_list):
+        """Generate ace_cache_begin.m and ace_cache_reset.m"""
+        for file_name, key_code in gen_cache_key_code(
+            len(var_list), self.save_mode
+        ).items():
+            gen_code = open(os.path.join(self.new_code_dir, file_name), "wt")
+            gen_code.write(key_code)
+            gen_code.close()
+
+    def get_key_input(self):
+        """
+        Return the cell of the root inputs but the mask keying the cache, e.g.
+        "{signal}", None if the cache is not keyed on the root inputs.
+        """
+        if not self.key_input:
+            return None
+        root_inputs = self.call_pattern.get(self.rootfile, {}).get("input", [])
+        key_inputs = [name for name in root_inputs if name != self.mask_name]
+        if len(key_inputs) == 0:
+            return None
+        return "{" + ", ".join(key_inputs) + "}"
+
+    def key_root(self, func_save_vars):
+        """Key the cache on the root inputs if the root function is not rewritten"""
+        key_input = self.get_key_input()
+        for func, save_var_list in func_save_vars:
+            if func == self.rootfile and len(save_var_list) > 0:
+                return
+        if key_input is None:
+            return
+
+        root_code = key_root_in_matlab(
+            os.path.join(self.folder, self.rootfile + ".m"), key_input
+        )
+        gen_code = open(os.path.join(self.new_code_dir, self.rootfile + ".m"), "wt")
+        gen_code.write(root_code)
+        gen_code.close()
+
+    def gen_var_index(self, var_list):
+        """Generate the index of the variables for the control vector"""
+        if self.index_mode == "strcmp":
+            index_var_code = gen_strcmp_index_code(var_list)
+        else:
+            index_var_code = gen_map_index_code(get_var_indices(var_list))
+
+        gen_code = open(os.path.join(self.new_code_dir, "get_var_index.m"), "wt")
         gen_code.write(index_var_code)
         gen_code.close()
 
     def select_save_vars(self, func, system_func_list):
         print("====", func)
-        block, _ = analyze_var_usage(os.path.join(self.folder, func + ".m"))
+        block, _, def_use = analyze_var_usage(os.path.join(self.folder, func + ".m"))
 
         save_var_list = select_non_loop_used_vars(
             block,
             valid_save_func=self.process_func + system_func_list,
-            sub_folders=sub_folders,
+            sub_folders=self.subfolders,
+            def_use=def_use,
+            loop_save_func=list(self.call_pattern) + system_func_list,
         )
+        for block_def_use in def_use.values():
+            for var in save_var_list:
+                if block_def_use.get_loop_index(var) is not None:
+                    self.loop_vars[var] = block_def_use.get_loop_index(var)
+                    self.save_counts[var] = block_def_use.get_save_count(var)
         return save_var_list
 
-    def generate_save_code(self, func, save_var_list):
+    def generate_save_code(self, func, save_var_list, var_index=None):
         """Generate the code to save the variables"""
         if len(save_var_list) == 0:
             return
 
         save_cmd = save_vars_in_matlab(
-            os.path.join(self.folder, func + ".m"), save_var_list
+            os.path.join(self.folder, func + ".m"),
+            save_var_list,
+            var_index,
+            self.save_mode,
+            self.get_key_input() if func == self.rootfile else None,
+            self.loop_vars,
         )
 
         # save the matlab code
-        gen_code = open(os.path.join(new_code_dir, func + ".m"), "wt")
+        gen_code = open(os.path.join(self.new_code_dir, func + ".m"), "wt")
         gen_code.write(save_cmd)
         gen_code.close()
 
 
+def get_var_indices(var_list):
+    """
+    Return the index of each saved variable in the control vector, the last one wins
+    for the variables of the same name as in the strcmp chain of get_var_index.
+    """
+    var_index = {}
+    for ind, var in enumerate(var_list):
+        var_index[var.var_name] = ind + 1
+    return var_index
+
+
+def gen_strcmp_index_code(var_list):
+    """Generate get_var_index.m comparing the name with every saved variable"""
+    index_var_code = "function ind = get_var_index(var_name)\nind=0;\n"
+    for ind, var in enumerate(var_list):
+        index_var_code = (
+            index_var_code
+            + f"if (strcmp(var_name, '{var.var_name}'))\n  ind={ind+1};\nend\n"
+        )
+    return index_var_code + "end\n"
+
+
+def gen_map_index_code(var_index: dict):
+    """Generate get_var_index.m looking up a containers.Map built on the first call"""
+    keys = ", ".join(f"'{var_name}'" for var_name in var_index)
+    values = ", ".join(str(ind) for ind in var_index.values())
+    index_var_code = "function ind = get_var_index(var_name)\n"
+    index_var_code += "persistent var_index;\n"
+    index_var_code += "if isempty(var_index)\n"
+    if var_index:
+        index_var_code += f"  var_index = containers.Map({{{keys}}}, {{{values}}});\n"
+    else:
+        index_var_code += "  var_index = containers.Map();\n"
+    index_var_code += "end\n"
+    index_var_code += "if isKey(var_index, var_name)\n"
+    index_var_code += "  ind = var_index(var_name);\nelse\n  ind = 0;\nend\n"
+    return index_var_code + "end\n"
+
+
 if __name__ == "__main__":
     import argparse
     import os
-    import json
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--codedir", required=True, help="Path to the code directory")
@@ -105,7 +341,9 @@ if __name__ == "__main__":
         "--rootfunc", required=True, help="Function name of the root file"
     )
     parser.add_argument(
-        "--callgraph", required=True, help="Json file of the call pattern"
+        "--callgraph",
+        required=True,
+        help="Json or compact binary file of the call pattern",
     )
     parser.add_argument(
         "--subfolder",
@@ -115,16 +353,100 @@ if __name__ == "__main__":
         help="Relative path to the sub folders in the code directory",
     )
 
+    parser.add_argument(
+        "--cachedir",
+        required=False,
+        default=None,
+        help="Directory to store the parse results for incremental re-runs",
+    )
+    parser.add_argument(
+        "--indexmode",
+        required=False,
+        default="strcmp",
+        choices=INDEX_MODES,
+        help="Look up the variable index by strcmp chain, containers.Map, or inline "
+        "the constant indices at the call sites",
+    )
+    parser.add_argument(
+        "--savemode",
+        required=False,
+        default="global",
+        choices=SAVE_MODES,
+        help="Keep the saved variables in one global each, in one cache handle, or "
+        "in one cache handle persisted to disk",
+    )
+    parser.add_argument(
+        "--diskdir",
+        required=False,
+        default=DISK_CACHE_DIR,
+        help="Folder of the disk cache in the disk save mode",
+    )
+    parser.add_argument(
+        "--diskbudget",
+        required=False,
+        type=int,
+        default=None,
+        help="Maximum size in bytes of the disk cache in the disk save mode",
+    )
+    parser.add_argument(
+        "--keyinput",
+        action="store_true",
+        help="Reset the cache in the root function when its inputs but the mask "
+        "change. Without it, the cached values are never invalidated unless the caller "
+        "runs ace_cache_begin or ace_cache_reset",
+    )
+    parser.add_argument(
+        "--maskname",
+        required=False,
+        default="mask",
+        help="Name of the root function input selecting the features",
+    )
+    parser.add_argument(
+        "--costprofile",
+        required=False,
+        default=None,
+        help="Json file of the cost and output size estimates of the functions",
+    )
+    parser.add_argument(
+        "--jsontag",
+        required=False,
+        default=None,
+        help="Json file from function_tag.py with cost and size annotations",
+    )
+    parser.add_argument(
+        "--memorybudget",
+        required=False,
+        type=int,
+        default=None,
+        help="Maximum total size in bytes of the cached values",
+    )
+    parser.add_argument(
+        "--instrument",
+        action="store_true",
+        help="Generate code logging the runtime and output size of the calls instead",
+    )
+    parser.add_argument(
+        "--profilelog",
+        required=False,
+        default="ace_profile.log",
+        help="Log file written by the instrumented code, pass it to --costprofile",
+    )
     args = parser.parse_args()
 
+    if args.cachedir:
+        PARSE_CACHE.set_cache_dir(args.cachedir)
+
     code_dir = args.codedir
     new_code_dir = args.newcodedir
     sub_folders = args.subfolder
     func_call = args.rootfunc
     callgraph = args.callgraph
 
-    with open(callgraph, "r") as file:
-        call_graph = json.load(file)
+    call_graph = load_call_graph(callgraph)
+
+    cost_model = None
+    if args.costprofile or args.jsontag or args.memorybudget is not None:
+        cost_model = load_cost_model(args.costprofile, args.jsontag)
 
     # create the new folder
     if os.path.isdir(new_code_dir):
@@ -154,7 +476,23 @@ if __name__ == "__main__":
             )
 
     strategy = VarSave_EmotionalClassification(
-        code_dir, func_call, sub_folders, call_graph
+        code_dir,
+        func_call,
+        sub_folders,
+        call_graph,
+        new_code_dir,
+        args.indexmode,
+        args.savemode,
+        cost_model,
+        args.memorybudget,
+        args.diskdir,
+        args.diskbudget,
+        args.keyinput,
+        args.maskname,
     )
     strategy.select_examine_subfuncs()
-    strategy.process_examined_subfuncs(["plomb"])
+    if args.instrument:
+        strategy.instrument_examined_subfuncs(["plomb"], args.profilelog)
+    else:
+        strategy.process_examined_subfuncs(["plomb"])
+    print(PARSE_CACHE.summary())
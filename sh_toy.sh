@@ -3,9 +3,9 @@ python function_tag.py --codedir toy_example --subdir compute_features --outdir
 python function_call_analysis.py \
     --codedir toy_example --subfolder compute_features \
     --rootfile ROOT_extract_bio_features  --jsontag toy_tag.json \
-    --outdir toy_DAG.json --visualize 2
+    --outdir toy_DAG.json --visualize 2 --cachedir .ace_cache
 
 python save_vars_matlab.py \
     --codedir toy_example --newcodedir toy_example_new \
     --rootfunc ROOT_extract_bio_features --callgraph toy_DAG.json \
-    --subfolder compute_features
\ No newline at end of file
+    --subfolder compute_features --cachedir .ace_cache
\ No newline at end of file
@@ -0,0 +1,78 @@
+# - conftest.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Fixtures running the pipeline on the toy example - - - - - - - - - - - - - - - - -  #
+import io
+import os
+import shutil
+import tempfile
+import contextlib
+import pytest
+from function_tag import list_func_files, tag_func_files
+from function_call_analysis import CallGraph, call_analysis, save_cnt_graph
+from save_vars_matlab import VarSave_EmotionalClassification
+
+TOY_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "toy_example")
+TOY_ROOT = "ROOT_extract_bio_features"
+TOY_SUBFOLDERS = ["compute_features"]
+
+
+def read_code(code_dir: str, func_name: str):
+    """Return the Matlab code of the function in the generated code folder"""
+    with open(os.path.join(code_dir, func_name + ".m"), "r") as file:
+        return file.read()
+
+
+@pytest.fixture(scope="session")
+def toy_tag():
+    """Tag json of the toy example as generated by function_tag.py"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return tag_func_files(list_func_files(TOY_DIR, TOY_SUBFOLDERS + ["."]))
+
+
+@pytest.fixture(scope="session")
+def toy_root_node(toy_tag):
+    """Root node of the call graph of the toy example"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return call_analysis(
+            TOY_DIR,
+            TOY_ROOT + ".m",
+            toy_tag,
+            call_graph=CallGraph(),
+            sub_func_folders=TOY_SUBFOLDERS,
+        )
+
+
+@pytest.fixture(scope="session")
+def toy_call_graph(toy_root_node):
+    """Call graph json of the toy example as generated by function_call_analysis.py"""
+    return save_cnt_graph(toy_root_node, {})
+
+
+@pytest.fixture
+def gen_toy_code(tmp_path, toy_call_graph):
+    """
+    Return the function generating the code of the toy example as save_vars_matlab.py,
+    taking the call graph, whether to instrument and the strategy options, and
+    returning the generated code folder.
+    """
+
+    def gen_code(call_graph=None, instrument=False, **kwargs):
+        new_code_dir = os.path.join(tempfile.mkdtemp(dir=tmp_path), "new")
+        shutil.copytree(TOY_DIR, new_code_dir)
+        strategy = VarSave_EmotionalClassification(
+            TOY_DIR,
+            TOY_ROOT,
+            TOY_SUBFOLDERS,
+            toy_call_graph if call_graph is None else call_graph,
+            new_code_dir,
+            **kwargs,
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            strategy.select_examine_subfuncs()
+            if instrument:
+                strategy.instrument_examined_subfuncs(["plomb"])
+            else:
+                strategy.process_examined_subfuncs(["plomb"])
+        return new_code_dir
+
+    return gen_code
+
@@ -0,0 +1,43 @@
+# - test_callgraph_format.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - -  #
+# - Tests of the compact binary format of the call graph - - - - - - - - - - - - - - -  #
+import json
+import filecmp
+from function_call_analysis import iter_cnt_graph
+from utils.callgraph_format import (
+    CompactCallGraph,
+    load_call_graph,
+    write_compact_graph,
+)
+
+
+def compare_dirs(dir_a: str, dir_b: str):
+    """Determine whether the two folders have the same files with the same content"""
+    comparison = filecmp.dircmp(dir_a, dir_b)
+    if comparison.left_only or comparison.right_only:
+        return False
+    _, mismatch, errors = filecmp.cmpfiles(
+        dir_a, dir_b, comparison.common_files, shallow=False
+    )
+    if mismatch or errors:
+        return False
+    return all(
+        compare_dirs(sub_dir.left, sub_dir.right)
+        for sub_dir in comparison.subdirs.values()
+    )
+
+
+def test_compact_graph_round_trip(
+    tmp_path, toy_root_node, toy_call_graph, gen_toy_code
+):
+    graph_file = str(tmp_path / "toy_DAG.acg")
+    with open(graph_file, "wb") as outfile:
+        write_compact_graph(iter_cnt_graph(toy_root_node), outfile)
+
+    call_graph = load_call_graph(graph_file)
+    assert isinstance(call_graph, CompactCallGraph)
+    # the json graph as loaded from the json file
+    json_graph = json.loads(json.dumps(toy_call_graph))
+    assert list(call_graph) == list(json_graph)
+    assert {name: call_graph[name] for name in call_graph} == json_graph
+
+    assert compare_dirs(gen_toy_code(call_graph), gen_toy_code(json_graph))
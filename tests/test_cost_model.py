@@ -0,0 +1,51 @@
+# - test_cost_model.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -  #
+# - Tests of the selection of the variables worth caching - - - - - - - - - - - - - - - #
+from utils.adapter.cost_model import CostModel, select_by_cost
+from utils.parser.line import generate_logical_lines
+from utils.parser.var_usage_analysis import analyze_logical_lines
+
+COST_MODEL = CostModel({"helper": {"cost": 0.2, "size": 800}})
+
+
+def analyze_vars(code: list):
+    """Return the variables of the function by name and its def-use index"""
+    top_var_list, _, def_use = analyze_logical_lines(
+        list(generate_logical_lines(code))
+    )
+    (var_list,) = top_var_list.values()
+    (block_def_use,) = def_use.values()
+    return {var.var_name: var for var in var_list}, block_def_use
+
+
+def test_select_call_outputs_together():
+    code = ["function y = f(x)", "[a, b] = helper(x);", "y = a + b;", "end"]
+    variables, _ = analyze_vars(code)
+    save_var_list = [variables["a"], variables["b"]]
+
+    # both outputs are charged against the budget
+    assert select_by_cost(save_var_list, COST_MODEL, 1000) == []
+    assert select_by_cost(save_var_list, COST_MODEL, 1600) == save_var_list
+
+
+def test_select_loop_indexed_size():
+    code = [
+        "function y = f(x)",
+        "for ch = 1:4",
+        "    p = helper(x(:, ch));",
+        "    y(ch) = p;",
+        "end",
+        "for k = 1:size(x, 2)",
+        "    q = helper(x(:, k));",
+        "    y(k) = y(k) + q;",
+        "end",
+        "end",
+    ]
+    variables, block_def_use = analyze_vars(code)
+    p, q = variables["p"], variables["q"]
+    save_counts = {var: block_def_use.get_save_count(var) for var in [p, q]}
+    assert save_counts == {p: 4, q: None}
+
+    # one value per iteration, the unknown iterations do not fit any budget
+    assert select_by_cost([p, q], COST_MODEL, 3000, save_counts) == []
+    assert select_by_cost([p, q], COST_MODEL, 3200, save_counts) == [p]
+    assert select_by_cost([p, q], COST_MODEL, None, save_counts) == [p, q]
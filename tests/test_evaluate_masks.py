@@ -0,0 +1,64 @@
+# - test_evaluate_masks.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -  #
+# - Tests of the mask slicing of evaluate_masks.m - - - - - - - - - - - - - - - - - - - #
+from function_call_analysis import get_mask_slices, get_output_concat
+from save_vars_matlab import VarSave_EmotionalClassification
+from utils.adapter.gen_matlab_save_code import gen_evaluate_masks_code
+
+FUNCTION_ATTRIBUTES = {
+    "time_feats": {"input": ["x", "mask"], "output": ["feat"]},
+    "freq_feats": {"input": ["x", "mask"], "output": ["feat"]},
+}
+
+
+def gen_evaluate_masks(concat_line: str):
+    """Return evaluate_masks.m of the root function concatenating the features"""
+    code_lines = [
+        "function feats = root(signal, mask)",
+        "time_feat = time_feats(signal, mask(1:3));",
+        "freq_feat = freq_feats(signal, mask(4:5));",
+        concat_line,
+    ]
+    mask_slices = get_mask_slices(code_lines, FUNCTION_ATTRIBUTES)
+    output_concat = get_output_concat(code_lines, "feats")
+    return gen_evaluate_masks_code("root", mask_slices, output_concat)
+
+
+def test_output_concat():
+    code_lines = ["function y = f(x)", "a = g(x);", "y = [a, b c];"]
+    assert get_output_concat(code_lines, "y") == ["a", "b", "c"]
+    assert get_output_concat(code_lines + ["y = [y, a];"], "y") is None
+    assert get_output_concat(["y = [a; b];"], "y") is None
+    assert get_output_concat(["y = [a(1), b];"], "y") is None
+
+
+def test_slice_in_concat_order():
+    code = gen_evaluate_masks("feats = [time_feat, freq_feat];")
+    assert "union_mask" in code
+
+
+def test_fall_back_to_per_mask():
+    for concat_line in [
+        "feats = [freq_feat, time_feat];",
+        "feats = [time_feat; freq_feat];",
+        "feats = time_feat;",
+    ]:
+        code = gen_evaluate_masks(concat_line)
+        assert "union_mask" not in code
+        assert "feats{ind} = root(signal, masks(ind, :));" in code
+
+
+def test_mask_name():
+    code_lines = [
+        "function feats = root(signal, sel)",
+        "time_feat = time_feats(signal, sel(1:3));",
+        "freq_feat = freq_feats(signal, sel(4:5));",
+        "feats = [time_feat, freq_feat];",
+    ]
+    mask_slices = get_mask_slices(code_lines, FUNCTION_ATTRIBUTES, mask_name="sel")
+    assert [(start, end) for _, start, end, _ in mask_slices] == [(1, 3), (4, 5)]
+
+    call_graph = {"root": {"input": ["signal", "sel"], "output": ["feats"]}}
+    strategy = VarSave_EmotionalClassification(
+        "", "root", [], call_graph, "", key_input=True, mask_name="sel"
+    )
+    assert strategy.get_key_input() == "{signal}"
@@ -0,0 +1,17 @@
+# - test_function_tag.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -  #
+# - Tests of the tagging of the function attributes - - - - - - - - - - - - - - - - - - #
+import io
+import json
+import contextlib
+from function_tag import list_func_files, tag_func_files
+from conftest import TOY_DIR, TOY_SUBFOLDERS
+
+
+def test_parallel_tag_identical():
+    func_files = list_func_files(TOY_DIR, TOY_SUBFOLDERS + ["."])
+    with contextlib.redirect_stdout(io.StringIO()):
+        serial_tag = tag_func_files(func_files, jobs=1)
+        parallel_tag = tag_func_files(func_files, jobs=2)
+    assert serial_tag
+    # compare the json dumps, which also keep the order of the functions
+    assert json.dumps(parallel_tag, indent=4) == json.dumps(serial_tag, indent=4)
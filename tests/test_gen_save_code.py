@@ -0,0 +1,144 @@
+# - test_gen_save_code.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Golden snippets of the code caching the variables of the toy example - - - - - - -  #
+import os
+from conftest import TOY_ROOT, read_code
+
+STRCMP_INDEX = """function ind = get_var_index(var_name)
+ind=0;
+if (strcmp(var_name, 'filter_sig'))
+  ind=1;
+end
+if (strcmp(var_name, 'f1'))
+  ind=2;
+end
+"""
+
+MAP_INDEX = """function ind = get_var_index(var_name)
+persistent var_index;
+if isempty(var_index)
+  var_index = containers.Map({'filter_sig', 'f1', 'f2', 'f3', 'f4', 'f5'}, {1, 2, 3, 4, 5, 6});
+end
+if isKey(var_index, var_name)
+  ind = var_index(var_name);
+else
+  ind = 0;
+end
+end
+"""
+
+LOOKUP_FILTER_SAVE = """if ctrl_vec(get_var_index('filter_sig'))
+    filter_sig = filter_input(freq_signal);
+    ctrl_vec(get_var_index('filter_sig'))=0;
+end
+"""
+
+INLINE_FILTER_SAVE = """if ctrl_vec(1)
+    filter_sig = filter_input(freq_signal);
+    ctrl_vec(1)=0;
+end
+"""
+
+INLINE_F5_SAVE = """if ctrl_vec(6)
+        f5 = feat5(y);
+    ctrl_vec(6)=0;
+end
+"""
+
+
+def test_index_modes(gen_toy_code):
+    code_dir = gen_toy_code(index_mode="strcmp")
+    assert read_code(code_dir, "get_var_index").startswith(STRCMP_INDEX)
+    assert LOOKUP_FILTER_SAVE in read_code(code_dir, TOY_ROOT)
+
+    code_dir = gen_toy_code(index_mode="map")
+    assert read_code(code_dir, "get_var_index") == MAP_INDEX
+    assert LOOKUP_FILTER_SAVE in read_code(code_dir, TOY_ROOT)
+
+    # the indices are inlined, get_var_index.m is only kept for the callers
+    code_dir = gen_toy_code(index_mode="inline")
+    assert read_code(code_dir, "get_var_index") == MAP_INDEX
+    assert INLINE_FILTER_SAVE in read_code(code_dir, TOY_ROOT)
+    freq_code = read_code(code_dir, "compute_freq_domain_feats")
+    assert INLINE_F5_SAVE in freq_code
+    assert "get_var_index" not in freq_code
+
+
+GLOBAL_FILTER_SAVE = """function feats = ROOT_extract_bio_features(signal, mask)
+global ctrl_vec;
+global filter_sig;
+
+time_domain_feat = compute_time_domain_feats(signal, mask(1:3));
+
+freq_signal = fft(signal);
+if ctrl_vec(get_var_index('filter_sig'))
+    filter_sig = filter_input(freq_signal);
+    ctrl_vec(get_var_index('filter_sig'))=0;
+end
+"""
+
+STRUCT_FILTER_SAVE = """function feats = ROOT_extract_bio_features(signal, mask)
+ace_cache_handle = ace_cache();
+
+time_domain_feat = compute_time_domain_feats(signal, mask(1:3));
+
+freq_signal = fft(signal);
+if ace_cache_handle.ctrl_vec(get_var_index('filter_sig'))
+    filter_sig = filter_input(freq_signal);
+    ace_cache_handle.vals.filter_sig = filter_sig;
+    ace_cache_handle.ctrl_vec(get_var_index('filter_sig'))=0;
+else
+    filter_sig = ace_cache_handle.vals.filter_sig;
+end
+"""
+
+DISK_FILTER_SAVE = """function feats = ROOT_extract_bio_features(signal, mask)
+ace_cache_handle = ace_cache();
+
+time_domain_feat = compute_time_domain_feats(signal, mask(1:3));
+
+freq_signal = fft(signal);
+if ace_cache_handle.ctrl_vec(get_var_index('filter_sig'))
+    if ace_disk_has('filter_sig')
+        filter_sig = ace_disk_load('filter_sig');
+    else
+        filter_sig = filter_input(freq_signal);
+        ace_disk_store('filter_sig', filter_sig);
+    end
+    ace_cache_handle.vals.filter_sig = filter_sig;
+    ace_cache_handle.ctrl_vec(get_var_index('filter_sig'))=0;
+else
+    filter_sig = ace_cache_handle.vals.filter_sig;
+end
+"""
+
+CACHE_INIT = """ace_cache_handle = ace_cache();
+ace_cache_handle.ctrl_vec = ones(1, 6);
+"""
+
+DISK_FILES = [
+    "ace_disk_begin",
+    "ace_disk_evict",
+    "ace_disk_has",
+    "ace_disk_load",
+    "ace_disk_no_key",
+    "ace_disk_store",
+]
+
+
+def test_save_modes(gen_toy_code):
+    code_dir = gen_toy_code(save_mode="global")
+    assert read_code(code_dir, TOY_ROOT).startswith(GLOBAL_FILTER_SAVE)
+    assert "global filter_sig;\nglobal f1;\n" in read_code(code_dir, "init_globals")
+    assert not os.path.exists(os.path.join(code_dir, "ace_cache.m"))
+
+    code_dir = gen_toy_code(save_mode="struct")
+    assert read_code(code_dir, TOY_ROOT).startswith(STRUCT_FILTER_SAVE)
+    assert read_code(code_dir, "init_cache") == CACHE_INIT
+    assert not os.path.exists(os.path.join(code_dir, "init_globals.m"))
+    assert not os.path.exists(os.path.join(code_dir, "ace_disk_store.m"))
+
+    code_dir = gen_toy_code(save_mode="disk")
+    assert read_code(code_dir, TOY_ROOT).startswith(DISK_FILTER_SAVE)
+    assert read_code(code_dir, "init_cache") == CACHE_INIT
+    for func_name in DISK_FILES:
+        assert os.path.exists(os.path.join(code_dir, func_name + ".m"))
@@ -0,0 +1,34 @@
+# - test_instrument.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -  #
+# - Tests of the code profiling the calls of the user functions - - - - - - - - - - - - #
+from conftest import read_code
+
+FILTER_PROFILE = """ace_prof_tic = tic;
+filter_sig = filter_input(freq_signal);
+ace_prof_time = toc(ace_prof_tic);
+ace_prof_bytes = 0;
+ace_prof_info = whos('filter_sig');
+ace_prof_bytes = ace_prof_bytes + ace_prof_info.bytes;
+ace_log_cost('filter_input', ace_prof_time, ace_prof_bytes, 1);
+"""
+
+
+def test_profile_every_call_site(gen_toy_code):
+    new_code_dir = gen_toy_code(instrument=True)
+
+    root_code = read_code(new_code_dir, "ROOT_extract_bio_features")
+    assert FILTER_PROFILE in root_code
+    for func_name in ["compute_time_domain_feats", "compute_freq_domain_feats"]:
+        assert f"ace_log_cost('{func_name}', " in root_code
+    # the system function fft is not profiled
+    assert root_code.count("ace_log_cost(") == 3
+
+    time_code = read_code(new_code_dir, "compute_time_domain_feats")
+    for func_name in ["feat1", "feat2", "feat3"]:
+        assert f"    ace_log_cost('{func_name}', " in time_code
+    freq_code = read_code(new_code_dir, "compute_freq_domain_feats")
+    for func_name in ["feat4", "feat5"]:
+        assert f"    ace_log_cost('{func_name}', " in freq_code
+
+    log_code = read_code(new_code_dir, "ace_log_cost")
+    assert log_code.startswith("function ace_log_cost(func_name, elapsed, bytes")
+    assert "fopen('ace_profile.log', 'a')" in log_code
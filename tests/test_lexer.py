@@ -0,0 +1,43 @@
+# - test_lexer.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Tests of the Matlab tokenizer - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+from utils.parser.lexer import NUMBER, OPERATOR, SEPARATOR, SPACE, tokenize
+
+
+def lex(expr: str):
+    """Return the (kind, text) of the tokens of the expression but the spaces"""
+    return [(token.kind, token.text) for token in tokenize(expr) if token.kind != SPACE]
+
+
+def test_double_transpose():
+    assert lex("a''")[1:] == [(OPERATOR, "'"), (OPERATOR, "'")]
+    assert lex("x.''")[1:] == [(OPERATOR, ".'"), (OPERATOR, "'")]
+
+
+def test_signed_number_after_operator():
+    assert lex("a*-1") == [("ident", "a"), (OPERATOR, "*"), (NUMBER, "-1")]
+    assert lex("f(a, +2)")[4] == (NUMBER, "+2")
+    assert lex("a-1") == [("ident", "a"), (OPERATOR, "-"), (NUMBER, "1")]
+
+
+def test_elementwise_operator_after_number():
+    assert lex("2.*x") == [(NUMBER, "2"), (OPERATOR, ".*"), ("ident", "x")]
+
+
+def test_exponent_number():
+    assert lex("1e-3") == [(NUMBER, "1e-3")]
+
+
+def test_concat_separator():
+    assert lex("[a -b]")[2] == (SEPARATOR, " ")
+    assert lex("[a -1 2]") == [
+        ("open", "["),
+        ("ident", "a"),
+        (SEPARATOR, " "),
+        (NUMBER, "-1"),
+        (SEPARATOR, " "),
+        (NUMBER, "2"),
+        ("close", "]"),
+    ]
+    assert SEPARATOR not in [kind for kind, _ in lex("[a - b]")]
+    assert SEPARATOR not in [kind for kind, _ in lex("[a ~= b]")]
+    assert SEPARATOR not in [kind for kind, _ in lex("f(a -b)")]
@@ -0,0 +1,69 @@
+# - test_loop_analysis.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Tests of the loop invariant and loop indexed variables - - - - - - - - - - - - - -  #
+from utils.parser.expr_class import ForLoopAST
+from utils.parser.line import generate_logical_lines
+from utils.parser.var_usage_analysis import analyze_logical_lines
+
+
+def analyze_loops(code: str):
+    """Return the loop invariant names and the loop indexed names : loop variable"""
+    logical_lines = list(generate_logical_lines(code.split("\n")))
+    _, _, def_use = analyze_logical_lines(logical_lines)
+    block_def_use = next(iter(def_use.values()))
+    invariant = {var.var_name for var in block_def_use.loop_invariant}
+    indexed = {
+        var.var_name: block_def_use.get_loop_index(var)
+        for var in block_def_use.loop_indexed
+    }
+    return invariant, indexed
+
+
+def test_loop_indexed_range():
+    code = "\n".join(
+        [
+            "function out = f(x, nch)",
+            "w = hann(10);",
+            "for ch = 1:nch",
+            "    y = feat1(x, w);",
+            "    p = feat2(x(:, ch));",
+            "    q = feat3(p, ch);",
+            "    out(ch) = y + q;",
+            "end",
+            "end",
+        ]
+    )
+    invariant, indexed = analyze_loops(code)
+    assert invariant == {"y"}
+    assert indexed == {"p": "ch"}
+
+
+def test_loop_stepped_range():
+    code = "\n".join(
+        [
+            "function out = f(x, n)",
+            "for ch = 1:0.5:3",
+            "    p = feat1(x, ch);",
+            "end",
+            "for k = 1:2:n",
+            "    q = feat2(x(k));",
+            "end",
+            "for i = 1:numel(x(2:end))",
+            "    r = feat3(x(i));",
+            "end",
+            "out = 0;",
+            "end",
+        ]
+    )
+    invariant, indexed = analyze_loops(code)
+    assert invariant == set()
+    assert indexed == {"q": "k", "r": "i"}
+
+
+def test_for_loop_step():
+    code = ["function y = f(x)", "for k = 1:2:9", "end", "end"]
+    top_var_list, _, _ = analyze_logical_lines(list(generate_logical_lines(code)))
+    (var_list,) = top_var_list.values()
+    (loop_var,) = [var for var in var_list if var.var_name == "k"]
+    loop = loop_var.get_block()
+    assert isinstance(loop, ForLoopAST)
+    assert loop.start.value == 1 and loop.step.value == 2 and loop.end.value == 9
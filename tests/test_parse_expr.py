@@ -0,0 +1,93 @@
+# - test_parse_expr.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -  #
+# - Regression tests of the Matlab expression parser - - - - - - - - - - - - - - - - -  #
+import pytest
+from utils.parser.expr_class import (
+    BinaryExprAST,
+    CallExprAST,
+    StringExprAST,
+)
+from utils.parser.lexer import split_assignment
+from utils.parser.line import generate_logical_lines
+from utils.parser.parse_expr import parse_basic_computation
+from utils.parser.var_usage_analysis import analyze_logical_lines
+
+
+def analyze_code(code: str):
+    """Return the variables of the first function in the code by name"""
+    top_var_list, _, _ = analyze_logical_lines(
+        list(generate_logical_lines(code.split("\n")))
+    )
+    var_list = next(iter(top_var_list.values()))
+    return {var.var_name: var for var in var_list}
+
+
+def test_split_assignment_skips_strings():
+    assert split_assignment("s = 'a = b + c'") == ("s ", " 'a = b + c'")
+    assert split_assignment("t = a == b") == ("t ", " a == b")
+    assert split_assignment("disp('a = b')") is None
+
+
+def test_string_literal_with_assignment():
+    variables = analyze_code("function y = f(b, c)\ns = 'a = b + c';\ny = s;\nend")
+    (production,) = variables["s"].production.values()
+    assert isinstance(production, StringExprAST)
+    assert len(variables["b"].usage) == 0
+
+
+def test_unterminated_string_operand():
+    with pytest.raises(ValueError):
+        parse_basic_computation("'a")
+
+
+def test_double_transpose():
+    variables = analyze_code("function y = f(a)\ny = a'';\nz = a.'';\nend")
+    (production,) = variables["y"].production.values()
+    assert production.op == "'" and production.left_op.op == "'"
+    (production,) = variables["z"].production.values()
+    assert production.op == "'" and production.left_op.op == ".'"
+
+
+def parse_rhs(rhs: str):
+    """Return the production of y = rhs and the variables of the function by name"""
+    variables = analyze_code(f"function y = f(a, b, c, d)\ny = {rhs};\nend")
+    (production,) = variables["y"].production.values()
+    return production, variables
+
+
+def assert_binary(expr, op, left_op, right_op):
+    """Assert the binary expression and return its operands"""
+    assert isinstance(expr, BinaryExprAST) and expr.op == op
+    if left_op is not None:
+        assert expr.left_op is left_op
+    if right_op is not None:
+        assert expr.right_op is right_op
+    return expr.left_op, expr.right_op
+
+
+def test_precedence_with_call():
+    production, variables = parse_rhs("a + b * sqrt(c)")
+    _, product = assert_binary(production, "+", variables["a"], None)
+    _, call = assert_binary(product, "*", variables["b"], None)
+    assert isinstance(call, CallExprAST) and call.func_name == "sqrt"
+    assert call.args == [variables["c"]]
+
+
+def test_precedence_with_slice():
+    production, variables = parse_rhs("a - b(1) * c")
+    _, product = assert_binary(production, "-", variables["a"], None)
+    assert_binary(product, "*", variables["b"], variables["c"])
+
+
+def test_precedence_in_call_args():
+    production, variables = parse_rhs("f(a + b * c, d)")
+    assert isinstance(production, CallExprAST) and production.func_name == "f"
+    total, last_arg = production.args
+    _, product = assert_binary(total, "+", variables["a"], None)
+    assert_binary(product, "*", variables["b"], variables["c"])
+    assert last_arg is variables["d"]
+
+
+def test_power_left_associative():
+    production, variables = parse_rhs("a ^ b ^ c")
+    power, _ = assert_binary(production, "^", None, variables["c"])
+    assert_binary(power, "^", variables["a"], variables["b"])
@@ -0,0 +1,8 @@
+function ace_cache_begin(signal_id)
+% reset the cache unless it holds the values of signal_id
+global ace_cache_key;
+if isempty(ace_cache_key) || ~isequal(ace_cache_key{1}, signal_id)
+    ace_cache_reset();
+    ace_cache_key = {signal_id};
+end
+end
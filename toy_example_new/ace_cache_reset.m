@@ -0,0 +1,6 @@
+function ace_cache_reset()
+% mark every variable to compute and forget the current input
+global ctrl_vec ace_cache_key;
+ctrl_vec = ones(1, 6);
+ace_cache_key = {};
+end
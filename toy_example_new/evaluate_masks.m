@@ -0,0 +1,20 @@
+function feats = evaluate_masks(signal, masks)
+% evaluate every row of masks on the same signal
+masks = logical(masks);
+if size(masks, 2) < 5
+    error('evaluate_masks: the masks need 5 columns');
+end
+ace_cache_begin({signal});
+feats = cell(size(masks, 1), 1);
+union_mask = any(masks, 1);
+union_feats = ROOT_extract_bio_features(signal, union_mask);
+if numel(union_feats) == nnz(union_mask)
+    for ind = 1:size(masks, 1)
+        feats{ind} = union_feats(masks(ind, union_mask));
+    end
+else
+    for ind = 1:size(masks, 1)
+        feats{ind} = ROOT_extract_bio_features(signal, masks(ind, :));
+    end
+end
+end
@@ -0,0 +1,212 @@
+# - cost_model.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Estimate whether caching a variable pays off and select the variables to save - - - #
+import csv
+import json
+import math
+from utils.parser.expr_class import CallExprAST
+
+# default overhead of a cached variable: the control vector check and index lookup in
+# seconds, and the time in seconds per byte to store the value
+LOOKUP_COST = 1e-5
+STORE_COST_PER_BYTE = 1e-9
+
+
+class CostModel:
+    """
+    Per-function estimates of the recompute cost in seconds and the output size in
+    bytes. The functions without estimate are considered expensive so that they are
+    cached as without cost model. Subclass it to plug in another estimation.
+    """
+
+    def __init__(
+        self,
+        func_costs: dict = None,
+        default_cost=math.inf,
+        default_size=0,
+        lookup_cost=LOOKUP_COST,
+        store_cost_per_byte=STORE_COST_PER_BYTE,
+    ):
+        # function name : {"cost": seconds, "size": bytes}
+        self.func_costs = {}
+        for func_name, estimate in (func_costs or {}).items():
+            self.func_costs[get_base_name(func_name)] = estimate
+        self.default_cost = default_cost
+        self.default_size = default_size
+        self.lookup_cost = lookup_cost
+        self.store_cost_per_byte = store_cost_per_byte
+
+    def cost(self, func_name: str):
+        """Return the time in seconds to recompute the outputs of the function"""
+        estimate = self.func_costs.get(get_base_name(func_name), {})
+        return estimate.get("cost", self.default_cost)
+
+    def size(self, func_name: str):
+        """Return the size in bytes of one output of the function"""
+        estimate = self.func_costs.get(get_base_name(func_name), {})
+        return estimate.get("size", self.default_size)
+
+    def overhead(self, size):
+        """Return the time in seconds to look up and store a cached value of size"""
+        return self.lookup_cost + self.store_cost_per_byte * size
+
+    def benefit(self, func_name: str):
+        """Return the time saved by caching an output of the function once reused"""
+        return self.cost(func_name) - self.overhead(self.size(func_name))
+
+    def update(self, func_costs: dict):
+        """Overwrite the estimates of the functions in func_costs"""
+        for func_name, estimate in func_costs.items():
+            self.func_costs.setdefault(get_base_name(func_name), {}).update(estimate)
+
+
+def get_base_name(func_name: str):
+    """Remove the sub folder prefix of the function name in the tag json"""
+    return func_name.split("/")[-1]
+
+
+def get_producer(var):
+    """Return the call producing the variable, None if no call"""
+    for expr in var.production.values():
+        if isinstance(expr, CallExprAST):
+            return expr
+    return None
+
+
+def get_producer_name(var):
+    """Return the name of the function producing the variable, None if no call"""
+    producer = get_producer(var)
+    return None if producer is None else producer.func_name
+
+
+def load_profile_log(log_file: str):
+    """
+    Load the log written by the code instrumented with save_vars_matlab.py --instrument,
+    one line per call: function name, runtime in seconds, bytes of the outputs and
+    number of outputs.
+
+    Returns:
+        func_costs (dict): function name : mean runtime "cost", mean size of one output
+        "size" and number of logged "calls".
+    """
+    records = {}
+    with open(log_file, "r", newline="") as file:
+        for row in csv.reader(file):
+            if len(row) != 4:
+                continue
+            func_name, elapsed, num_bytes, num_outputs = row
+            record = records.setdefault(func_name, [0, 0.0, 0.0])
+            record[0] += 1
+            record[1] += float(elapsed)
+            record[2] += float(num_bytes) / max(int(num_outputs), 1)
+
+    return {
+        func_name: {"cost": time / calls, "size": size / calls, "calls": calls}
+        for func_name, (calls, time, size) in records.items()
+    }
+
+
+def load_cost_model(profile: str = None, tag_file: str = None, **kwargs):
+    """
+    Load the cost model from the estimates annotated in the tag json generated by
+    function_tag.py and from the profile file, the profile overwrites the annotations.
+
+    Both files map the function name to its estimates, e.g.
+        {"compute_features/feat1": {"cost": 0.02, "size": 8000}}
+    the tag json entries keep their input and output fields. A profile ending with
+    ".log" is the log of the instrumented code, see load_profile_log.
+
+    Args:
+        profile (str, optional): path of the json profile file or the profile log.
+            Defaults to None.
+        tag_file (str, optional): path of the tag json file. Defaults to None.
+        kwargs: overhead parameters of CostModel.
+
+    Returns:
+        cost_model (CostModel): the loaded cost model.
+    """
+    cost_model = CostModel(**kwargs)
+    for file_dir in [tag_file, profile]:
+        if file_dir is None:
+            continue
+        if file_dir.endswith(".log"):
+            entries = load_profile_log(file_dir)
+        else:
+            with open(file_dir, "r") as file:
+                entries = json.load(file)
+
+        func_costs = {}
+        for func_name, entry in entries.items():
+            estimate = {key: entry[key] for key in ["cost", "size"] if key in entry}
+            if estimate:
+                func_costs[func_name] = estimate
+        cost_model.update(func_costs)
+    return cost_model
+
+
+def select_by_cost(
+    save_var_list: list, cost_model: CostModel, memory_budget=None, save_counts=None
+):
+    """
+    Select the variables worth caching: the recompute cost of their producer exceeds
+    the lookup and storage overhead. The outputs of one call are selected or dropped
+    together, as the call is only skipped if all of them are cached. Under a memory
+    budget in bytes, the calls saving the most time per byte are kept first.
+
+    Args:
+        save_var_list (list): candidate variables to save.
+        cost_model (CostModel): estimates of the producers.
+        memory_budget (int, optional): maximum total size of the cached values in
+            bytes, no limit if None. Defaults to None.
+        save_counts (dict, optional): variable : number of values saved, e.g. the
+            iterations of the loop indexing it, None if unknown. The variables not
+            in it are saved once. Defaults to None.
+
+    Returns:
+        save_var_list (list): the selected variables in their original order.
+    """
+    save_counts = save_counts or {}
+
+    # producing call, or the variable itself if not produced by a call : indices
+    groups = {}
+    for ind, var in enumerate(save_var_list):
+        producer = get_producer(var)
+        groups.setdefault(var if producer is None else producer, []).append(ind)
+
+    candidates = []
+    for producer, inds in groups.items():
+        if not isinstance(producer, CallExprAST):
+            # no estimate for the variables not produced by a call, keep them
+            candidates.append((math.inf, 0, inds))
+            continue
+        func_name = producer.func_name
+        size = cost_model.size(func_name)
+        benefit = cost_model.cost(func_name) - len(inds) * cost_model.overhead(size)
+        if benefit <= 0:
+            continue
+
+        counts = [save_counts.get(save_var_list[ind], 1) for ind in inds]
+        if None in counts:
+            # the size of the values saved per iteration is not bounded
+            if memory_budget is not None:
+                continue
+            count = 1
+        else:
+            count = max(counts)
+        candidates.append((benefit * count, len(inds) * size * count, inds))
+
+    if memory_budget is not None:
+        # greedy knapsack by the time saved per byte
+        candidates.sort(
+            key=lambda c: c[0] / c[1] if c[1] > 0 else math.inf, reverse=True
+        )
+        selected = []
+        used_memory = 0
+        for benefit, size, inds in candidates:
+            if used_memory + size > memory_budget:
+                continue
+            used_memory += size
+            selected.append((benefit, size, inds))
+        candidates = selected
+
+    selected_inds = sorted(ind for _, _, inds in candidates for ind in inds)
+    return [save_var_list[ind] for ind in selected_inds]
@@ -1,16 +1,25 @@
 import os
 from function_tag import parse_list
-from utils.parser.line import (
-    remove_empty_space_before_line,
-    remove_cmt_in_line,
-    remove_empty_space_before_line,
-    skip_line,
-    merge_line,
-)
 from utils.parser.expr_class import VariableExprAST, CallExprAST
+from utils.parser.parse_cache import get_code_lines, get_logical_lines
+from utils.adapter.cost_model import get_producer_name
 
 INCLASS_PATH = "/Users/yuxuan/Projects/23 fall/INCLASS/src_paper"
 
+# ways to keep the saved variables and the control vector:
+# global: one Matlab global per saved variable
+# struct: the fields of one handle object returned by ace_cache()
+# disk: as struct, and persisted to MAT files keyed by the hash of the signal
+SAVE_MODES = ["global", "struct", "disk"]
+# local name of the cache handle in the generated functions
+CACHE_HANDLE = "ace_cache_handle"
+# prefix of the local variables of the profiling code
+PROFILE_PREFIX = "ace_prof_"
+# prefix of the globals holding the values of the loop indexed variables per iteration
+ITER_PREFIX = "ace_iter_"
+# default folder of the disk cache, relative to the working directory of Matlab
+DISK_CACHE_DIR = "ace_disk_cache"
+
 
 def is_mask_related_func(
     func: CallExprAST, mask_compute_funcname="calculate_idxs_from_mask"
@@ -27,7 +36,18 @@ def is_mask_related_func(
     return False
 
 
-def generate_save_cmd(orig_code, empty_chars=""):
+def get_ctrl_index(var_name: str, var_index: dict = None):
+    """
+    Return the Matlab expression of the index of the variable in the control vector,
+    the constant index if var_index is given, otherwise the call to get_var_index.
+    """
+    if var_index is not None:
+        # 0 as get_var_index for the variables not saved
+        return str(var_index.get(var_name, 0))
+    return f"get_var_index('{var_name}')"
+
+
+def generate_save_cmd(orig_code, empty_chars="", var_index=None, save_mode="global"):
     """
     Generate the save command in matlab
 
@@ -36,6 +56,11 @@ def generate_save_cmd(orig_code, empty_chars=""):
         proces_func (str): processed function name
         folder_dir (str): directory of the folder to save the useful data
         empty_chars (str, optional): empty chars before the orignal code. Defaults to "".
+        var_index (dict, optional): variable name : index in the control vector, the
+            constant indices are inlined instead of calling get_var_index if given.
+            Defaults to None.
+        save_mode (str, optional): "global", "struct" or "disk", see SAVE_MODES.
+            Defaults to "global".
 
     Returns:
         str: save command
@@ -48,10 +73,34 @@ def generate_save_cmd(orig_code, empty_chars=""):
                 y = user_f(x);
                 ctrl_vec(get_var_index(y)) = 0;
             end
+
+        or in the struct mode
+            if ace_cache_handle.ctrl_vec(get_var_index(y))
+                y = user_f(x);
+                ace_cache_handle.vals.y = y;
+                ace_cache_handle.ctrl_vec(get_var_index(y)) = 0;
+            else
+                y = ace_cache_handle.vals.y;
+            end
+
+        or in the disk mode
+            if ace_cache_handle.ctrl_vec(get_var_index(y))
+                if ace_disk_has('y')
+                    y = ace_disk_load('y');
+                else
+                    y = user_f(x);
+                    ace_disk_store('y', y);
+                end
+                ace_cache_handle.vals.y = y;
+                ace_cache_handle.ctrl_vec(get_var_index(y)) = 0;
+            else
+                y = ace_cache_handle.vals.y;
+            end
     """
     left_expr = orig_code.split("=")[0].strip()
     output_vars = parse_list(left_expr)
     save_cmd = ""
+    ctrl_vec = "ctrl_vec" if save_mode == "global" else f"{CACHE_HANDLE}.ctrl_vec"
 
     if_clause = ""
     for output_var in output_vars:
@@ -61,102 +110,623 @@ def generate_save_cmd(orig_code, empty_chars=""):
         if if_clause:
             if_clause += " || "
 
-        if_clause += f"ctrl_vec(get_var_index('{output_var}'))"
+        if_clause += f"{ctrl_vec}({get_ctrl_index(output_var, var_index)})"
 
     save_cmd += f"if {if_clause}\n"
-    save_cmd += "    " + orig_code + "\n"
+    if save_mode == "disk":
+        # warm start from the disk, compute and persist the values otherwise
+        save_vars = [output_var for output_var in output_vars if output_var != "~"]
+        has_args = ", ".join(f"'{output_var}'" for output_var in save_vars)
+        save_cmd += f"    if ace_disk_has({has_args})\n"
+        for output_var in save_vars:
+            save_cmd += f"        {output_var} = ace_disk_load('{output_var}');\n"
+        save_cmd += "    else\n"
+        save_cmd += "        " + orig_code + "\n"
+        for output_var in save_vars:
+            save_cmd += f"        ace_disk_store('{output_var}', {output_var});\n"
+        save_cmd += "    end\n"
+    else:
+        save_cmd += "    " + orig_code + "\n"
 
     for output_var in output_vars:
         if output_var == "~":
             continue
 
+        if save_mode != "global":
+            save_cmd += f"    {CACHE_HANDLE}.vals.{output_var} = {output_var};\n"
         # not allowed write anymore
-        save_cmd += f"    ctrl_vec(get_var_index('{output_var}'))=0;\n"
+        save_cmd += f"    {ctrl_vec}({get_ctrl_index(output_var, var_index)})=0;\n"
+
+    if save_mode != "global":
+        # restore the local variables from the cache
+        save_cmd += "else\n"
+        for output_var in output_vars:
+            if output_var == "~":
+                continue
+            save_cmd += f"    {output_var} = {CACHE_HANDLE}.vals.{output_var};\n"
 
     save_cmd += "end\n"
 
     return save_cmd
 
 
-def is_rewrite_line(lines, start_ind, rewrite_line):
-    """Determine whether the line needs to be rewritten"""
-    for [ind, line] in enumerate(lines):
-        if not line.endswith("..."):
-            return start_ind + ind in rewrite_line
-    return False
+def get_cache_name(var_name: str, loop_var: str = None):
+    """Return the global holding the saved variable, per iteration if loop indexed"""
+    return var_name if loop_var is None else ITER_PREFIX + var_name
+
+
+def generate_iter_save_cmd(
+    orig_code, loop_var, empty_chars="", var_index=None, save_mode="global"
+):
+    """
+    Generate the save command of the variables computed at each iteration of the loop
+    over loop_var, the values are saved in a cell indexed by the loop variable and
+    the computed iterations are skipped.
+
+    Example:
+        orig_code = "y = user_f(x(:, ch))", loop_var = "ch"
+
+        Return
+            if ctrl_vec(get_var_index('y'))
+                ace_iter_y = {};
+                ctrl_vec(get_var_index('y'))=0;
+            end
+            if numel(ace_iter_y) < ch || isempty(ace_iter_y{ch})
+                y = user_f(x(:, ch));
+                ace_iter_y{ch} = y;
+            else
+                y = ace_iter_y{ch};
+            end
+
+        the cells are fields of ace_cache_handle.vals in the struct mode, and the disk
+        mode saves each iteration as y_<ch> on the disk. An empty value is recomputed
+        at each call.
+    """
+    left_expr = orig_code.split("=")[0].strip()
+    output_vars = [var for var in parse_list(left_expr) if var != "~"]
+    if save_mode == "global":
+        ctrl_vec = "ctrl_vec"
+        cells = [get_cache_name(var, loop_var) for var in output_vars]
+    else:
+        ctrl_vec = f"{CACHE_HANDLE}.ctrl_vec"
+        cells = [f"{CACHE_HANDLE}.vals.{var}" for var in output_vars]
+
+    # the cells are reset when the control vector marks the variables to compute
+    if_clause = " || ".join(
+        f"{ctrl_vec}({get_ctrl_index(var, var_index)})" for var in output_vars
+    )
+    save_cmd = f"if {if_clause}\n"
+    for var, cell in zip(output_vars, cells):
+        save_cmd += f"    {cell} = {{}};\n"
+        save_cmd += f"    {ctrl_vec}({get_ctrl_index(var, var_index)})=0;\n"
+    save_cmd += "end\n"
+
+    if_clause = " || ".join(
+        f"numel({cell}) < {loop_var} || isempty({cell}{{{loop_var}}})"
+        for cell in cells
+    )
+    save_cmd += f"if {if_clause}\n"
+    if save_mode == "disk":
+        disk_names = [f"sprintf('{var}_%d', {loop_var})" for var in output_vars]
+        save_cmd += f"    if ace_disk_has({', '.join(disk_names)})\n"
+        for var, disk_name in zip(output_vars, disk_names):
+            save_cmd += f"        {var} = ace_disk_load({disk_name});\n"
+        save_cmd += "    else\n"
+        save_cmd += "        " + orig_code + "\n"
+        for var, disk_name in zip(output_vars, disk_names):
+            save_cmd += f"        ace_disk_store({disk_name}, {var});\n"
+        save_cmd += "    end\n"
+    else:
+        save_cmd += "    " + orig_code + "\n"
+    for var, cell in zip(output_vars, cells):
+        save_cmd += f"    {cell}{{{loop_var}}} = {var};\n"
+    save_cmd += "else\n"
+    for var, cell in zip(output_vars, cells):
+        save_cmd += f"    {var} = {cell}{{{loop_var}}};\n"
+    save_cmd += "end\n"
+
+    return save_cmd
 
 
 def save_vars_in_matlab(
     file_dir: str,
     save_var_list: list,
-    maximum_looklen=10,
+    var_index: dict = None,
+    save_mode: str = "global",
+    key_input: str = None,
+    loop_vars: dict = None,
 ):
     """
     Generate the variable save code in matlab
 
     Args:
         file_name: the name of the file to process
-        call_pattern: the function call pattern
-        maximum_looklen: maximum number of lines to look ahead
+        save_var_list: the variables to save, produced by the rewritten lines
+        var_index: variable name : constant index in the control vector to inline,
+            call get_var_index if None
+        save_mode: keep the variables in globals or in the cache handle, see SAVE_MODES
+        key_input: inputs of the root function keying the cache with ace_cache_begin,
+            e.g. "{signal}", None for the other functions or if not keyed
+        loop_vars: loop indexed variable : name of the loop variable, the variable
+            is saved per iteration
 
     Return:
         save_cmd: the command to save the variables and add save cmd after the function call
     """
 
+    loop_vars = loop_vars or {}
+    if save_mode != "global":
+        func_header = f"{CACHE_HANDLE} = ace_cache();\n"
+    else:
+        global_declare = [
+            "global " + get_cache_name(var.var_name, loop_vars.get(var)) + ";"
+            for var in save_var_list
+        ]
+        func_header = "global ctrl_vec;\n" + "\n".join(global_declare) + "\n"
+
+    def rewrite(line, indent):
+        return generate_save_cmd(line, indent, var_index, save_mode)
+
+    def iter_rewrite(loop_var):
+        return lambda line, indent: generate_iter_save_cmd(
+            line, loop_var, indent, var_index, save_mode
+        )
+
+    rewrite_cmd = {}
+    for var in save_var_list:
+        if var in loop_vars:
+            rewrite_cmd[var.get_attr("line")] = iter_rewrite(loop_vars[var])
+        else:
+            rewrite_cmd[var.get_attr("line")] = rewrite
+    rewrite_cmd.update(get_key_rewrite_cmd(file_dir, key_input))
+    return rewrite_matlab_code(file_dir, rewrite_cmd, func_header)
+
+
+def generate_profile_cmd(orig_code, func_name, empty_chars=""):
+    """
+    Generate the profiling command in matlab, which logs the runtime of the call and
+    the size of its outputs with ace_log_cost.
+
+    Example:
+        orig_code = "y = user_f(x)"
+
+        Return
+            ace_prof_tic = tic;
+            y = user_f(x)
+            ace_prof_time = toc(ace_prof_tic);
+            ace_prof_bytes = 0;
+            ace_prof_info = whos('y');
+            ace_prof_bytes = ace_prof_bytes + ace_prof_info.bytes;
+            ace_log_cost('user_f', ace_prof_time, ace_prof_bytes, 1);
+    """
+    left_expr = orig_code.split("=")[0].strip()
+    output_vars = [var for var in parse_list(left_expr) if var != "~"]
+
+    profile_cmd = f"{empty_chars}{PROFILE_PREFIX}tic = tic;\n"
+    profile_cmd += orig_code + "\n"
+    profile_cmd += f"{empty_chars}{PROFILE_PREFIX}time = toc({PROFILE_PREFIX}tic);\n"
+    profile_cmd += f"{empty_chars}{PROFILE_PREFIX}bytes = 0;\n"
+    for output_var in output_vars:
+        profile_cmd += f"{empty_chars}{PROFILE_PREFIX}info = whos('{output_var}');\n"
+        profile_cmd += (
+            f"{empty_chars}{PROFILE_PREFIX}bytes = "
+            f"{PROFILE_PREFIX}bytes + {PROFILE_PREFIX}info.bytes;\n"
+        )
+    profile_cmd += (
+        f"{empty_chars}ace_log_cost('{func_name}', {PROFILE_PREFIX}time, "
+        f"{PROFILE_PREFIX}bytes, {len(output_vars)});\n"
+    )
+    return profile_cmd
+
+
+def instrument_calls_in_matlab(file_dir: str, var_list: list):
+    """
+    Generate the matlab code that profiles the calls producing the variables
+
+    Args:
+        file_dir (str): the name of the file to process.
+        var_list (list): the variables produced by the profiled calls, one call is
+            profiled once for all its outputs.
+
+    Returns:
+        new_code (str): the instrumented code.
+    """
+    rewrite_cmd = {}
+    for var in var_list:
+        func_name = get_producer_name(var)
+        if func_name is None:
+            continue
+
+        def rewrite(line, indent, func_name=func_name):
+            return generate_profile_cmd(line, func_name, indent)
+
+        rewrite_cmd[var.get_attr("line")] = rewrite
+    return rewrite_matlab_code(file_dir, rewrite_cmd)
+
+
+def gen_log_cost_code(log_file: str):
+    """Generate ace_log_cost.m appending one call record to the log file"""
+    log_code = "function ace_log_cost(func_name, elapsed, bytes, num_outputs)\n"
+    log_code += f"log_id = fopen('{log_file}', 'a');\n"
+    log_code += (
+        "fprintf(log_id, '%s,%.9f,%d,%d\\n', func_name, elapsed, bytes, num_outputs);\n"
+    )
+    log_code += "fclose(log_id);\n"
+    log_code += "end\n"
+    return log_code
+
+
+def rewrite_matlab_code(file_dir: str, rewrite_cmd: dict, func_header: str = ""):
+    """
+    Copy the Matlab code and rewrite the complete lines.
+
+    Args:
+        file_dir (str): the name of the file to process.
+        rewrite_cmd (dict): index of the last code line of the rewritten line :
+            function taking the complete line and its indent, returning the new code.
+        func_header (str, optional): code inserted after each function declaration.
+            Defaults to "".
+
+    Returns:
+        new_code (str): the rewritten code.
+    """
     try:
-        with open(file_dir, "r") as file:
-            # Read the contents of the file
-            file_contents = file.read()
+        code_line = get_code_lines(file_dir)
+        logical_lines = get_logical_lines(file_dir)
     except FileNotFoundError:
         raise ValueError(f"The file '{file_dir}' was not found.")
 
-    # ignore the comments enclosed in %{ ... }%
-    code_line = file_contents.split("\n")
-    code_with_save = ""
-    line_state = -1
-    cond_line_ind = []
+    new_code = ""
     func_defined = False
-
-    rewrite_line = []
-    global_vars = []
-    for var in save_var_list:
-        rewrite_line.append(var._attr["line"])
-        global_vars.append(var.var_name)
-
-    for [ind, line] in enumerate(code_line):
+    for logical_line in logical_lines:
         if func_defined:
-            code_with_save += "global ctrl_vec;\n"
-            global_declare = ["global " + item + ";" for item in global_vars]
-            code_with_save += "\n".join(global_declare)
-            code_with_save += "\n"
+            new_code += func_header
             func_defined = False
-        # copy the original code
-        if not is_rewrite_line(
-            code_line[ind : ind + maximum_looklen], ind, rewrite_line
-        ):
-            code_with_save += line + "\n"
+
+        # copy the original code unless the complete line is rewritten
+        is_rewrite = logical_line.state == 0 and logical_line.last in rewrite_cmd
+        if not is_rewrite:
+            for line in code_line[logical_line.first : logical_line.last + 1]:
+                new_code += line + "\n"
 
         # skip the comment line
-        line_state = skip_line(line, line_state)
-        if line_state == 4:
-            cond_line_ind.append(ind)
-        if line_state != 0:
+        if logical_line.state != 0:
             continue
 
-        # empty space to allow it align with the original code
-        _, n_empty = remove_empty_space_before_line(line)
-        empty_chars = " " * n_empty
-
-        # process the complete line
-        pre_lines = [remove_cmt_in_line(code_line[i]) for i in cond_line_ind]
-        line = merge_line(remove_cmt_in_line(line), pre_lines, empty_chars)
-        cond_line_ind = []
-
+        line = logical_line.text
         if line.strip().startswith("function"):
             func_defined = True
 
-        if ind in rewrite_line:
-            save_cmd = generate_save_cmd(line, empty_chars)
-            code_with_save += save_cmd
+        if is_rewrite:
+            new_code += rewrite_cmd[logical_line.last](line, logical_line.indent)
+
+    return new_code
+
 
-    return code_with_save
+def gen_cache_code(num_vars: int, disk_dir: str = None, disk_budget: int = None):
+    """
+    Generate the Matlab files of the struct and disk save modes.
+
+    Args:
+        num_vars (int): number of saved variables.
+        disk_dir (str, optional): folder of the disk cache, the disk cache files are
+            generated if given. Defaults to None.
+        disk_budget (int, optional): maximum size in bytes of the disk cache, no limit
+            if None. Defaults to None.
+
+    Returns:
+        cache code (dict): file name : Matlab code, AceCache.m is the handle class
+        holding the control vector and the saved values, ace_cache.m returns the
+        handle shared by all functions, init_cache.m marks every variable to compute.
+        The disk mode adds ace_disk_begin.m selecting the signal, ace_disk_has.m,
+        ace_disk_load.m and ace_disk_store.m accessing its saved values, warning with
+        ace_disk_no_key.m if no signal is selected, and
+        ace_disk_evict.m removing the least recently used signals once the size of
+        the cache tracked by the handle exceeds the budget.
+    """
+    class_code = "classdef AceCache < handle\n"
+    class_code += "    properties\n"
+    class_code += "        ctrl_vec = [];\n"
+    class_code += "        vals = struct();\n"
+    if disk_dir is not None:
+        budget = "Inf" if disk_budget is None else str(int(disk_budget))
+        class_code += f"        disk_dir = '{disk_dir}';\n"
+        class_code += f"        disk_budget = {budget};\n"
+        class_code += "        disk_key = '';\n"
+        # bytes of the disk cache, unknown until the first eviction scans it
+        class_code += "        disk_used = -1;\n"
+    class_code += "        key = {};\n"
+    class_code += "    end\n"
+    class_code += "end\n"
+
+    getter_code = "function cache = ace_cache()\n"
+    getter_code += "persistent instance;\n"
+    getter_code += "if isempty(instance)\n"
+    getter_code += "    instance = AceCache();\n"
+    getter_code += "end\n"
+    getter_code += "cache = instance;\n"
+    getter_code += "end\n"
+
+    init_code = f"{CACHE_HANDLE} = ace_cache();\n"
+    init_code += f"{CACHE_HANDLE}.ctrl_vec = ones(1, {num_vars});\n"
+
+    cache_code = {
+        "AceCache.m": class_code,
+        "ace_cache.m": getter_code,
+        "init_cache.m": init_code,
+    }
+    if disk_dir is not None:
+        cache_code.update(DISK_CACHE_CODE)
+    return cache_code
+
+
+def gen_cache_key_code(num_vars: int, save_mode="global"):
+    """
+    Generate the Matlab files keying the cache on the input, any value compared by
+    isequal, e.g. the signal itself or a recording id.
+
+    Args:
+        num_vars (int): number of saved variables.
+        save_mode (str, optional): save mode of the generated code. Defaults to
+            "global".
+
+    Returns:
+        cache key code (dict): file name : Matlab code, ace_cache_begin.m resets the
+        cache unless it holds the values of the given input, ace_cache_reset.m marks
+        every variable to compute and forgets the input.
+    """
+    reset_code = "function ace_cache_reset()\n"
+    reset_code += "% mark every variable to compute and forget the current input\n"
+    if save_mode == "global":
+        key = "ace_cache_key"
+        get_key = "global ace_cache_key;\n"
+        reset_code += "global ctrl_vec ace_cache_key;\n"
+        reset_code += f"ctrl_vec = ones(1, {num_vars});\n"
+        reset_code += "ace_cache_key = {};\n"
+    else:
+        key = "cache.key"
+        get_key = "cache = ace_cache();\n"
+        reset_code += "init_cache;\n"
+        reset_code += f"{CACHE_HANDLE}.key = {{}};\n"
+        if save_mode == "disk":
+            reset_code += f"{CACHE_HANDLE}.disk_key = '';\n"
+    reset_code += "end\n"
+
+    begin_code = "function ace_cache_begin(signal_id)\n"
+    begin_code += "% reset the cache unless it holds the values of signal_id\n"
+    begin_code += get_key
+    begin_code += f"if isempty({key}) || ~isequal({key}{{1}}, signal_id)\n"
+    if save_mode == "disk":
+        # also select the disk entry of the new input
+        begin_code += "    ace_disk_begin(signal_id);\n"
+    else:
+        begin_code += "    ace_cache_reset();\n"
+    begin_code += f"    {key} = {{signal_id}};\n"
+    begin_code += "end\n"
+    begin_code += "end\n"
+
+    return {"ace_cache_begin.m": begin_code, "ace_cache_reset.m": reset_code}
+
+
+def get_key_rewrite_cmd(file_dir: str, input_var: str = None):
+    """
+    Return the rewrite command of rewrite_matlab_code calling ace_cache_begin on the
+    input right after the first function declaration, empty if input_var is None.
+    """
+    if input_var is None:
+        return {}
+
+    def rewrite(line, indent):
+        return line + "\n" + f"ace_cache_begin({input_var});\n"
+
+    for logical_line in get_logical_lines(file_dir):
+        if logical_line.state == 0 and logical_line.text.strip().startswith("function"):
+            return {logical_line.last: rewrite}
+    return {}
+
+
+def key_root_in_matlab(file_dir: str, input_var: str):
+    """
+    Generate the root function code calling ace_cache_begin on its inputs, so that the
+    cache is reset for every new input.
+
+    Args:
+        file_dir (str): the root function file.
+        input_var (str): the inputs keying the cache, e.g. "{signal}".
+
+    Returns:
+        new_code (str): the rewritten code.
+    """
+    return rewrite_matlab_code(file_dir, get_key_rewrite_cmd(file_dir, input_var))
+
+
+# the signal entries of the disk cache are the folders disk_dir/<hash of the signal>,
+# one MAT file per saved variable, the modification time of ace_last_used.mat orders
+# the entries for the eviction
+DISK_CACHE_CODE = {
+    "ace_disk_begin.m": """function ace_disk_begin(signal_id)
+% mark every variable to compute and select the disk entry of the input, the cell of
+% the root inputs is hashed input by input with their class, the text ids as chars
+init_cache;
+if ~iscell(signal_id)
+    signal_id = {signal_id};
+end
+bytes = uint8([]);
+for ind = 1:numel(signal_id)
+    value = signal_id{ind};
+    value_class = double(class(value));
+    if ischar(value) || isstring(value)
+        value = char(value);
+    end
+    if ~isnumeric(value) && ~islogical(value) && ~ischar(value)
+        error('ace_disk_begin: cannot hash an input of class %s', class(value));
+    end
+    value = double(value);
+    value = [value_class, size(value), real(value(:))', imag(value(:))'];
+    bytes = [bytes, typecast(value, 'uint8')];
+end
+if exist('OCTAVE_VERSION', 'builtin')
+    key = hash('md5', char(bytes));
+else
+    digest = java.security.MessageDigest.getInstance('MD5');
+    digest.update(bytes);
+    key = sprintf('%02x', typecast(digest.digest(), 'uint8'));
+end
+ace_cache_handle.disk_key = key;
+entry = fullfile(ace_cache_handle.disk_dir, key);
+if ~exist(entry, 'dir')
+    mkdir(entry);
+end
+last_used = now;
+save(fullfile(entry, 'ace_last_used.mat'), '-v7', 'last_used');
+end
+""",
+    "ace_disk_has.m": """function hit = ace_disk_has(varargin)
+% determine whether all the variables are saved for the current signal
+cache = ace_cache();
+hit = ~isempty(cache.disk_key);
+if ~hit
+    ace_disk_no_key();
+end
+for ind = 1:numel(varargin)
+    file = fullfile(cache.disk_dir, cache.disk_key, [varargin{ind} '.mat']);
+    hit = hit && exist(file, 'file') == 2;
+end
+end
+""",
+    "ace_disk_load.m": """function value = ace_disk_load(name)
+% load the saved variable of the current signal
+cache = ace_cache();
+data = load(fullfile(cache.disk_dir, cache.disk_key, [name '.mat']));
+value = data.value;
+end
+""",
+    "ace_disk_store.m": """function ace_disk_store(name, value)
+% save the variable of the current signal and keep the cache in its budget
+cache = ace_cache();
+if isempty(cache.disk_key)
+    ace_disk_no_key();
+    return;
+end
+file = fullfile(cache.disk_dir, cache.disk_key, [name '.mat']);
+% an overwritten file is replaced in the tracked size
+old_info = dir(file);
+save(file, '-v7', 'value');
+if isinf(cache.disk_budget)
+    return;
+end
+% scan the folder only once the tracked size exceeds the budget
+if cache.disk_used >= 0
+    info = dir(file);
+    cache.disk_used = cache.disk_used + info.bytes - sum([old_info.bytes]);
+end
+if cache.disk_used < 0 || cache.disk_used > cache.disk_budget
+    ace_disk_evict(cache);
+end
+end
+""",
+    "ace_disk_no_key.m": """function ace_disk_no_key()
+% warn once that the disk cache is not used until the cache is keyed on the input
+persistent warned;
+if isempty(warned)
+    warning('ace_cache:nokey', ['the disk cache is not used until ' ...
+        'ace_cache_begin keys the cache on the input']);
+    warned = true;
+end
+end
+""",
+    "ace_disk_evict.m": """function ace_disk_evict(cache)
+% remove the least recently used signal entries until the cache fits the budget
+if isinf(cache.disk_budget)
+    return;
+end
+entries = dir(cache.disk_dir);
+entries = entries([entries.isdir] & ~ismember({entries.name}, {'.', '..'}));
+sizes = zeros(1, numel(entries));
+last_used = zeros(1, numel(entries));
+for ind = 1:numel(entries)
+    entry = fullfile(cache.disk_dir, entries(ind).name);
+    files = dir(entry);
+    sizes(ind) = sum([files.bytes]);
+    stamp = dir(fullfile(entry, 'ace_last_used.mat'));
+    if ~isempty(stamp)
+        last_used(ind) = stamp.datenum;
+    end
+end
+[~, order] = sort(last_used);
+total = sum(sizes);
+for ind = order
+    if total <= cache.disk_budget
+        break;
+    end
+    if strcmp(entries(ind).name, cache.disk_key)
+        continue;
+    end
+    rmdir(fullfile(cache.disk_dir, entries(ind).name), 's');
+    total = total - sizes(ind);
+end
+cache.disk_used = total;
+end
+""",
+}
+
+
+def gen_evaluate_masks_code(
+    root_func: str, mask_slices: list, output_concat: list = None
+):
+    """
+    Generate evaluate_masks.m, the entry point evaluating several masks on one signal.
+    The cache is keyed on the signal once, the root function is called with the union
+    of the masks and the features of each mask are sliced out of the union features.
+    The slicing requires every mask bit to select one feature in order, which holds
+    when the slices of the mask passed by the root function are ascending and do not
+    overlap, and the root output concatenates the outputs of these calls in the same
+    order; otherwise the root function is called per mask and reuses the cached values.
+
+    Args:
+        root_func (str): name of the root function, called as root_func(signal, mask).
+        mask_slices (list): (function name, start bit, end bit, output) of the mask
+            slices in the root function, see function_call_analysis.get_mask_slices.
+        output_concat (list, optional): variables concatenated into the root output,
+            see function_call_analysis.get_output_concat. Defaults to None.
+
+    Returns:
+        evaluate masks code (str): the Matlab code of evaluate_masks.m.
+    """
+    ranges = [(start, end) for _, start, end, _ in mask_slices]
+    sliceable = len(ranges) > 0 and all(
+        start <= end and (ind == 0 or ranges[ind - 1][1] < start)
+        for ind, (start, end) in enumerate(ranges)
+    )
+    # the features are in the order of the mask slices
+    sliceable = sliceable and output_concat == [output for *_, output in mask_slices]
+
+    code = "function feats = evaluate_masks(signal, masks)\n"
+    code += "% evaluate every row of masks on the same signal\n"
+    code += "masks = logical(masks);\n"
+    if ranges:
+        mask_len = max(end for _, end in ranges)
+        code += f"if size(masks, 2) < {mask_len}\n"
+        code += f"    error('evaluate_masks: the masks need {mask_len} columns');\n"
+        code += "end\n"
+    # same key as the root function keyed on its inputs but the mask
+    code += "ace_cache_begin({signal});\n"
+    code += "feats = cell(size(masks, 1), 1);\n"
+
+    per_mask_code = "for ind = 1:size(masks, 1)\n"
+    per_mask_code += f"    feats{{ind}} = {root_func}(signal, masks(ind, :));\n"
+    per_mask_code += "end\n"
+    if not sliceable:
+        return code + per_mask_code + "end\n"
+
+    code += "union_mask = any(masks, 1);\n"
+    code += f"union_feats = {root_func}(signal, union_mask);\n"
+    code += "if numel(union_feats) == nnz(union_mask)\n"
+    code += "    for ind = 1:size(masks, 1)\n"
+    code += "        feats{ind} = union_feats(masks(ind, union_mask));\n"
+    code += "    end\n"
+    code += "else\n"
+    code += "".join("    " + line + "\n" for line in per_mask_code.splitlines())
+    code += "end\n"
+    code += "end\n"
+    return code
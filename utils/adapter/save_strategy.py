@@ -1,5 +1,5 @@
 import os
-from utils.parser.var_usage_analysis import analyze_var_usage
+from utils.parser.var_usage_analysis import analyze_var_usage, DefUseIndex
 from utils.parser.expr_class import CallExprAST, VariableExprAST, SliceExprAST
 from function_call_analysis import is_sub_func_called
 from utils.adapter.gen_matlab_save_code import is_mask_related_func
@@ -32,17 +32,17 @@ def is_once_called_func(
 ):
     # The variable propated to its children function can be regarded as constant if it is
     # produced once under the following conditions:
-    # 1. it is not in a loop, or
+    # 1. it is not in a loop or its inputs do not change in the loop, or
     # 2. it is in and only in one if clause
     func_called = []
-    block_expr, blocks = analyze_var_usage(os.path.join(folder_name, func_dir))
+    block_expr, blocks, def_use = analyze_var_usage(os.path.join(folder_name, func_dir))
 
     # Iterate over the block in each file, e.g. function definition.
-    for _, var_list in block_expr.items():
+    for block, var_list in block_expr.items():
         # Iterate over the variables in each block
         for var in var_list:
-            # Exclude variables that are not attached in the top level block
-            if var.in_loop:
+            # Exclude variables that change in the loop
+            if var.in_loop and not def_use[block].is_loop_invariant(var):
                 continue
             for _, expr in var.production.items():
                 if not isinstance(expr, CallExprAST) or (
@@ -88,28 +88,24 @@ def is_once_called_func(
     return parent_func, reuse_func_list
 
 
-def in_use_variable(var, var_list):
-    if len(var.usage) != 0:
-        return True
-
-    # detect whether brother variables is in use
-    for var1 in var_list:
-        set1 = set(var1.production.values())
-        set2 = set(var.production.values())
-        if bool(set1.intersection(set2)):
-            if len(var1.usage) != 0:
-                return True
-    return False
+def in_use_variable(var, def_use: DefUseIndex):
+    # detect whether the variable or its brother variables is in use
+    return def_use.is_used(var)
 
 
 def select_non_loop_used_vars(
     block_expr,
     valid_save_func: list,
     sub_folders: list[str] = [],
+    def_use: dict = None,
+    loop_save_func: list = None,
 ):
+    # the loop indexed variables may be produced by the functions called per
+    # iteration, loop_save_func, which are not examined as they are called repeatedly
     save_var_list = []
 
     for block, var_list in block_expr.items():
+        block_def_use = def_use[block] if def_use else DefUseIndex(var_list)
         # Exclude variables that are used in the slice expression
         for var in var_list:
             if isinstance(var, SliceExprAST):
@@ -118,14 +114,23 @@ def select_non_loop_used_vars(
             if var._varAttr == 1:
                 continue
             # Exclude variables that are not used
-            if not in_use_variable(var, var_list):
+            if not in_use_variable(var, block_def_use):
                 continue
-            # Exclude variables in the loop
-            if var.in_loop:
+            # Exclude variables in the loop unless they are loop invariant, which are
+            # computed at the first iteration and reused by the others, or indexed by
+            # the loop variable, which are saved per iteration
+            if (
+                var.in_loop
+                and not block_def_use.is_loop_invariant(var)
+                and block_def_use.get_loop_index(var) is None
+            ):
                 continue
+            save_func = valid_save_func
+            if block_def_use.get_loop_index(var) is not None and loop_save_func:
+                save_func = loop_save_func
             for slice, expr in var.production.items():
                 if isinstance(expr, CallExprAST) and is_sub_func_called(
-                    expr.func_name, valid_save_func, sub_folders
+                    expr.func_name, save_func, sub_folders
                 ):
                     if is_mask_related_func(expr):
                         continue
@@ -169,3 +174,20 @@ def select_top_level_used_vars(
                     print("save var: ", var.var_name)
                     save_var_list.append(var)
     return save_var_list
+
+
+def select_call_vars(block_expr, call_funcs: list, sub_folders: list[str] = []):
+    # one output variable of every call site assigning the outputs of the functions in
+    # call_funcs, the outputs assigned to a slice, e.g. x(i) = f(a), are skipped as
+    # their size cannot be measured by name
+    call_vars = []
+    for var_list in block_expr.values():
+        for var in var_list:
+            if isinstance(var, SliceExprAST):
+                continue
+            for expr in var.production.values():
+                if isinstance(expr, CallExprAST) and is_sub_func_called(
+                    expr.func_name, call_funcs, sub_folders
+                ):
+                    call_vars.append(var)
+    return call_vars
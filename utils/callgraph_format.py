@@ -0,0 +1,226 @@
+# - callgraph_format.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Provide the compact binary format of the function call graph - - - - - - - - - - - #
+import os
+import sys
+import mmap
+import json
+import array
+import struct
+from collections.abc import Mapping
+
+# extension of the compact call graph file
+COMPACT_GRAPH_EXT = ".acg"
+
+MAGIC = b"ACECG\x00\x01\x00"
+# number of nodes, strings, child edges, parent edges, input vars, output vars,
+# bytes of the string blob and bytes of the extra json
+HEADER = struct.Struct("<8s8I")
+
+
+def _int_array(values):
+    arr = array.array("i", values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def write_compact_graph(json_nodes, outfile):
+    """
+    Write the call graph in the compact binary format.
+
+    The strings are interned in one table whose first entries are the function names
+    in the node order, so that the id of a node is the id of its name. The children,
+    parents, input and output variables of the nodes are stored as CSR arrays of int32
+    string ids, which can be memory-mapped when loading the graph.
+
+    Args:
+        json_nodes (iterable): (function name, json description) of the nodes, e.g.
+            from iter_cnt_graph.
+        outfile: file opened in binary mode.
+    """
+    json_nodes = list(json_nodes)
+    strings = {}
+    for json_key, _ in json_nodes:
+        strings.setdefault(json_key, len(strings))
+
+    def csr(field):
+        ptr = [0]
+        ind = []
+        for _, json_value in json_nodes:
+            for name in json_value[field]:
+                ind.append(strings.setdefault(name, len(strings)))
+            ptr.append(len(ind))
+        return ptr, ind
+
+    child_ptr, child_ind = csr("child_nodes")
+    parent_ptr, parent_ind = csr("parent_nodes")
+    input_ptr, input_ind = csr("input")
+    output_ptr, output_ind = csr("output")
+
+    string_ptr = [0]
+    string_blob = bytearray()
+    for name in strings:
+        string_blob += name.encode("utf-8")
+        string_ptr.append(len(string_blob))
+
+    # the connected variables are rarely recorded, store the non-empty ones as json
+    extra = {}
+    for node_id, (_, json_value) in enumerate(json_nodes):
+        for field in ["cnt_vars_parents", "cnt_vars_children"]:
+            if json_value[field]:
+                extra.setdefault(str(node_id), {})[field] = json_value[field]
+    extra = json.dumps(extra).encode("utf-8") if extra else b""
+
+    outfile.write(
+        HEADER.pack(
+            MAGIC,
+            len(json_nodes),
+            len(strings),
+            len(child_ind),
+            len(parent_ind),
+            len(input_ind),
+            len(output_ind),
+            len(string_blob),
+            len(extra),
+        )
+    )
+    for values in [
+        child_ptr,
+        child_ind,
+        parent_ptr,
+        parent_ind,
+        input_ptr,
+        input_ind,
+        output_ptr,
+        output_ind,
+        string_ptr,
+    ]:
+        _int_array(values).tofile(outfile)
+    outfile.write(string_blob)
+    outfile.write(extra)
+
+
+class CompactCallGraph(Mapping):
+    """
+    Read-only view of a call graph stored in the compact binary format. It behaves like
+    the dict loaded from the json call graph: function name -> json description, and
+    the node descriptions are decoded on access from the memory-mapped file.
+    """
+
+    def __init__(self, file_dir: str):
+        with open(file_dir, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            self._num_nodes,
+            num_strings,
+            num_child,
+            num_parent,
+            num_input,
+            num_output,
+            blob_len,
+            extra_len,
+        ) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"'{file_dir}' is not a compact call graph file.")
+
+        self._offset = HEADER.size
+        self._child_ptr = self._read_ints(self._num_nodes + 1)
+        self._child_ind = self._read_ints(num_child)
+        self._parent_ptr = self._read_ints(self._num_nodes + 1)
+        self._parent_ind = self._read_ints(num_parent)
+        self._input_ptr = self._read_ints(self._num_nodes + 1)
+        self._input_ind = self._read_ints(num_input)
+        self._output_ptr = self._read_ints(self._num_nodes + 1)
+        self._output_ind = self._read_ints(num_output)
+        self._string_ptr = self._read_ints(num_strings + 1)
+
+        self._blob_offset = self._offset
+        extra_offset = self._blob_offset + blob_len
+        self._extra = {}
+        if extra_len:
+            self._extra = json.loads(
+                bytes(self._mmap[extra_offset : extra_offset + extra_len])
+            )
+
+        self._strings = {}
+        self._node_index = None
+
+    def _read_ints(self, num: int):
+        start = self._offset
+        self._offset += 4 * num
+        view = memoryview(self._mmap)[start : self._offset]
+        if sys.byteorder == "big":
+            arr = array.array("i", view)
+            arr.byteswap()
+            return arr
+        return view.cast("i")
+
+    def _string(self, string_id: int):
+        name = self._strings.get(string_id)
+        if name is None:
+            start = self._blob_offset + self._string_ptr[string_id]
+            stop = self._blob_offset + self._string_ptr[string_id + 1]
+            name = self._mmap[start:stop].decode("utf-8")
+            self._strings[string_id] = name
+        return name
+
+    def _strings_of(self, ptr, ind, node_id: int):
+        return [self._string(i) for i in ind[ptr[node_id] : ptr[node_id + 1]]]
+
+    def node_id(self, func_name: str):
+        """Return the integer id of the function, None if it is not in the graph"""
+        if self._node_index is None:
+            self._node_index = {
+                self._string(node_id): node_id for node_id in range(self._num_nodes)
+            }
+        return self._node_index.get(func_name)
+
+    def __getitem__(self, func_name: str):
+        node_id = self.node_id(func_name)
+        if node_id is None:
+            raise KeyError(func_name)
+
+        extra = self._extra.get(str(node_id), {})
+        return {
+            "child_nodes": self._strings_of(self._child_ptr, self._child_ind, node_id),
+            "parent_nodes": self._strings_of(
+                self._parent_ptr, self._parent_ind, node_id
+            ),
+            "input": self._strings_of(self._input_ptr, self._input_ind, node_id),
+            "output": self._strings_of(self._output_ptr, self._output_ind, node_id),
+            "cnt_vars_parents": extra.get("cnt_vars_parents", {}),
+            "cnt_vars_children": extra.get("cnt_vars_children", {}),
+        }
+
+    def __contains__(self, func_name):
+        return self.node_id(func_name) is not None
+
+    def __iter__(self):
+        for node_id in range(self._num_nodes):
+            yield self._string(node_id)
+
+    def __len__(self):
+        return self._num_nodes
+
+
+def is_compact_graph(file_dir: str):
+    """Determine whether the file is in the compact call graph format"""
+    with open(file_dir, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def load_call_graph(file_dir: str):
+    """
+    Load the call graph generated by function_call_analysis.py in the json or the
+    compact binary format.
+
+    Returns:
+        call graph (dict or CompactCallGraph): function name -> json description
+    """
+    if os.path.getsize(file_dir) >= HEADER.size and is_compact_graph(file_dir):
+        return CompactCallGraph(file_dir)
+
+    with open(file_dir, "r") as file:
+        return json.load(file)
@@ -3,12 +3,17 @@
 class ExprAST:
     """
     Base class to parse the expression.
+
+    The AST classes declare __slots__ to keep the parsed codebase resident at a small
+    memory cost, the attributes of a node are only allocated when one is marked.
     """
 
+    __slots__ = ("_content", "in_loop", "_attr")
+
     def __init__(self, content=None) -> None:
         self._content = ""
         self.in_loop = False
-        self._attr = {}
+        self._attr = None
 
     def __error__(self, msg: str):
         raise ValueError(msg)
@@ -20,14 +25,23 @@ class ExprAST:
         return len(self._content) == 0
 
     def mark_attr(self, key, value):
+        if self._attr is None:
+            self._attr = {}
         self._attr[key] = value
 
+    def get_attr(self, key, default=None):
+        if self._attr is None:
+            return default
+        return self._attr.get(key, default)
+
 
 class BlockAST:
     """
     Class to represent the block.
     """
 
+    __slots__ = ("type", "body", "_is_loop", "variable_list", "block")
+
     def __init__(self, body: list = []):
         self.type = None
         self.body = body
@@ -48,6 +62,8 @@ class NumberExprAST(ExprAST):
     Class to represent a numeric constant.
     """
 
+    __slots__ = ("value",)
+
     def __init__(self, value: str):
         super().__init__()
         self.value = float(value)
@@ -59,6 +75,8 @@ class VariableExprAST(ExprAST):
     Class to represent a variable.
     """
 
+    __slots__ = ("var_name", "notation", "production", "usage", "_varAttr", "block")
+
     def __init__(
         self,
         var_name: str,
@@ -76,7 +94,8 @@ class VariableExprAST(ExprAST):
         self.production = {}
         if not production.is_empty():
             self.production[slice] = self.child_AST(production)
-        self.usage = []
+        # the AST nodes hash by identity, the dict keeps them as an insertion-ordered set
+        self.usage = {}
         # add the attributes to record the variable usage including internal(0),
         # input(1), and output(2)
         self._varAttr = varAttr
@@ -91,8 +110,7 @@ class VariableExprAST(ExprAST):
 
     def __parent_AST__(self, expr: ExprAST):
         # avoid append the same usage during the recurse process
-        if expr not in self.usage:
-            self.usage.append(expr)
+        self.usage.setdefault(expr)
 
     def mark_parent_AST(self, expr: ExprAST):
         """
@@ -129,6 +147,8 @@ class StringExprAST(ExprAST):
     Class to represent a string constant.
     """
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         super().__init__()
         str_value = ""
@@ -149,6 +169,8 @@ class ConcatExprAST(ExprAST):
     Class to represent the concatenate expression in "[]".
     """
 
+    __slots__ = ("args", "block")
+
     def __init__(self, args=[]):
         super().__init__()
         self.args = args
@@ -176,6 +198,8 @@ class CellExprAST(VariableExprAST):
     Class to represent a boolean constant.
     """
 
+    __slots__ = ()
+
     def __init__(
         self,
         var_name: str,
@@ -192,6 +216,8 @@ class SliceExprAST(VariableExprAST):
     Class to represent a slice of a variable.
     """
 
+    __slots__ = ("var", "slice")
+
     def __init__(self, var: VariableExprAST, slice: StringExprAST):
         notation = var.notation + ":" + str(len(var.usage) + 1)
         super().__init__(var.var_name, notation)
@@ -209,6 +235,8 @@ class BinaryExprAST(ExprAST):
     Class to represent a binary operator.
     """
 
+    __slots__ = ("op", "left_op", "right_op", "args")
+
     def __init__(self, op: str, left_op: ExprAST, right_op: ExprAST):
         super().__init__()
         self.op = op
@@ -224,6 +252,8 @@ class CallExprAST(ExprAST):
     Class to represent a function call.
     """
 
+    __slots__ = ("func_name", "args")
+
     def __init__(self, func_name: str, args: list = []):
         super().__init__()
         self.func_name = func_name
@@ -252,6 +282,8 @@ class PrototypeAST:
     Class to represent the function prototype.
     """
 
+    __slots__ = ("func_name", "args", "_content")
+
     def __init__(self, func_name: str, args: list = []):
         super().__init__()
         self.func_name = func_name
@@ -267,6 +299,8 @@ class FunctionAST(BlockAST):
     Class to represent the function definition
     """
 
+    __slots__ = ("proto", "_content")
+
     def __init__(self, proto: PrototypeAST):
         super().__init__()
         self.proto = proto
@@ -286,19 +320,35 @@ class ForLoopAST(BlockAST):
     Class to represent the for loop.
     """
 
+    __slots__ = ("var", "range", "start", "end", "step", "_content")
+
     def __init__(
-        self, var: VariableExprAST, start: ExprAST, end: ExprAST, body: list = []
+        self,
+        var: VariableExprAST,
+        start: ExprAST,
+        end: ExprAST,
+        body: list = [],
+        step: ExprAST = None,
     ):
         super().__init__(body)
         self.var = var
         self.type = "for"
+        # the step of start:step:end, None if start:end
+        self.step = step
         if start == end:
             self.range = start
         else:
             self.start = start
             self.end = end
+        step_content = "" if step is None else step._content + ":"
         self._content = (
-            "for " + var.var_name + "=" + start._content + ":" + end._content
+            "for "
+            + var.var_name
+            + "="
+            + start._content
+            + ":"
+            + step_content
+            + end._content
         )
         self._is_loop = True
 
@@ -317,6 +367,8 @@ class WhileLoopAST(BlockAST):
     Class to represent the while loop.
     """
 
+    __slots__ = ("cond",)
+
     def __init__(self, cond: ExprAST, body=[]):
         super().__init__()
         self.type = "while"
@@ -336,6 +388,8 @@ class IfExprAST(BlockAST):
     Class to represent the if expression.
     """
 
+    __slots__ = ("cond", "cond_ind", "else_")
+
     def __init__(
         self,
         cond: ExprAST,
@@ -368,6 +422,8 @@ class TryExprAST(BlockAST):
     Class to represent the try expression.
     """
 
+    __slots__ = ("catch",)
+
     def __init__(self, content: ExprAST = ExprAST()):
         super().__init__()
         if isinstance(content, list):
@@ -392,6 +448,8 @@ class SwitchExprAST(BlockAST):
     Class to represent the if expression.
     """
 
+    __slots__ = ("var", "case")
+
     def __init__(
         self,
         var: ExprAST,
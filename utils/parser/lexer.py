@@ -0,0 +1,150 @@
+# - lexer.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Provide the tokenizer that splits a Matlab expression into typed tokens - - - - - - #
+import re
+from collections import namedtuple
+
+Token = namedtuple("Token", ["kind", "text", "start", "end"])
+
+# token kinds
+IDENT = "ident"
+NUMBER = "number"
+STRING = "string"
+OPERATOR = "op"
+OPEN = "open"
+CLOSE = "close"
+SPACE = "space"
+# the space separating two elements in a concatenation, e.g. in "[a -b]"
+SEPARATOR = "separator"
+OTHER = "other"
+
+NUMBER_PATTERN = r"(?:\d+(?:\.(?![*/\\^'])\d*)?|\.\d+)(?:[eE][+-]?\d+)?"
+
+# the operators are listed from the longest so that the regex matches greedily
+TOKEN_RE = re.compile(
+    r"(?P<space>[ \t]+)"
+    r"|(?P<ident>[A-Za-z_]\w*)"
+    rf"|(?P<number>{NUMBER_PATTERN})"
+    r"|(?P<op>==|~=|>=|<=|&&|\|\||\.\*|\./|\.\\|\.\^|\.'|[-+*/\\^><&|~:,.'])"
+    r"|(?P<open>[(\[{])"
+    r"|(?P<close>[)\]}])"
+    r"|(?P<quote>\")"
+    r"|(?P<other>[\s\S])"
+)
+SINGLE_QUOTE_STRING_RE = re.compile(r"'(?:[^']|'')*'?")
+DOUBLE_QUOTE_STRING_RE = re.compile(r'"(?:[^"]|"")*"?')
+SIGNED_NUMBER_RE = re.compile(rf"[-+]{NUMBER_PATTERN}")
+NUMBER_RE = re.compile(rf"[-+]?{NUMBER_PATTERN}")
+
+# kinds of tokens after which ' is the transpose operator instead of a string, the
+# transpose operators also end an operand, e.g. "a''"
+OPERAND_END = (IDENT, NUMBER, STRING, CLOSE)
+TRANSPOSE_OPERATORS = ("'", ".'")
+# brackets in which the space separates the elements
+CONCAT_BRACKETS = ("[", "{")
+
+
+def ends_operand(token: Token):
+    """Determine whether the token is the last token of an operand"""
+    if token.kind == OPERATOR:
+        return token.text in TRANSPOSE_OPERATORS
+    return token.kind in OPERAND_END
+
+
+def starts_element(expr: str, pos: int):
+    """
+    Determine whether a concatenation element starts at pos after a space, e.g. "b"
+    or "-b" in "[a -b]" but not "- b" in "[a - b]" nor "~=" in "[a ~= b]".
+    """
+    if pos >= len(expr):
+        return False
+    char = expr[pos]
+    if char.isalnum() or char in "_'\"([{":
+        return True
+    following = expr[pos + 1 : pos + 2]
+    if char == ".":
+        return following.isdigit()
+    if char in "+-~":
+        return following not in ["", " ", "\t", "="]
+    return False
+
+
+def tokenize(expr: str):
+    """
+    Split the Matlab expression into typed tokens in one pass.
+
+    The context dependent lexemes are resolved with the previous token: ' is the
+    transpose operator right after an operand and starts a string otherwise, and a
+    sign directly followed by a number is part of the number unless it follows an
+    operand, e.g. "f(a, -1)" gives the number "-1" but "a-1" gives "a", "-", "1".
+    In square brackets and braces, the space between an operand and the start of the
+    next element is a separator, e.g. "[a -1]" gives "a", " ", "-1" but "[a - 1]"
+    gives a subtraction.
+
+    Args:
+        expr (str): input expression.
+
+    Returns:
+        tokens (list[Token]): tokens with their kind, text and position in expr.
+    """
+    tokens = []
+    pos = 0
+    # whether the previous token, and the previous token that is not a space, ends an
+    # operand
+    after_operand = False
+    significant_after_operand = False
+    open_brackets = []
+    end = len(expr)
+    while pos < end:
+        match = TOKEN_RE.match(expr, pos)
+        kind = match.lastgroup
+        stop = match.end()
+
+        if kind == OPERATOR and match.group() == "'" and not after_operand:
+            # a single quote that does not follow an operand starts a string
+            kind = STRING
+            stop = SINGLE_QUOTE_STRING_RE.match(expr, pos).end()
+        elif kind == "quote":
+            kind = STRING
+            stop = DOUBLE_QUOTE_STRING_RE.match(expr, pos).end()
+        elif kind == OPERATOR and match.group() in ["-", "+"]:
+            if not significant_after_operand:
+                signed = SIGNED_NUMBER_RE.match(expr, pos)
+                if signed:
+                    kind = NUMBER
+                    stop = signed.end()
+        elif kind == SPACE and significant_after_operand:
+            if open_brackets and open_brackets[-1] in CONCAT_BRACKETS:
+                if starts_element(expr, stop):
+                    kind = SEPARATOR
+        elif kind == OPEN:
+            open_brackets.append(match.group())
+        elif kind == CLOSE and open_brackets:
+            open_brackets.pop()
+
+        token = Token(kind, expr[pos:stop], pos, stop)
+        tokens.append(token)
+        after_operand = ends_operand(token)
+        if kind != SPACE:
+            significant_after_operand = after_operand
+        pos = stop
+
+    return tokens
+
+
+def is_number_token(text: str):
+    """Determine whether the text is exactly one (signed) numeric literal"""
+    return NUMBER_RE.fullmatch(text) is not None
+
+
+def split_assignment(expr: str):
+    """
+    Split the statement at its assignment operator, the "=" in strings and in the
+    relational operators ==, ~=, <= and >= are not split.
+
+    Returns:
+        (lhs, rhs) (tuple): the left and right hand side, None if no assignment.
+    """
+    for token in tokenize(expr):
+        if token.kind == OTHER and token.text == "=":
+            return expr[: token.start], expr[token.end :]
+    return None
@@ -1,6 +1,7 @@
 # - line.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
 # - Provide support functions when parse a line - - - - - - - - - - - - - - - - - - - - #
 import re
+from collections import namedtuple
 
 
 def remove_empty_space_before_line(line: str):
@@ -34,12 +35,9 @@ def remove_cmt_in_line(line: str, ind=0):
     Returns:
         line (str): output line string without comments start by % from ind.
     """
-    while ind < len(line):
-        if line[ind] == "%":
-            line = line[:ind]
-            break
-        else:
-            ind = ind + 1
+    ind = line.find("%", ind)
+    if ind != -1:
+        line = line[:ind]
 
     return line
 
@@ -82,14 +80,30 @@ def get_line(file: str):
         line (str): the first line of the file.
         remainder (str): the rest of the file.
     """
-    if "\n" not in file:
-        return file, ""
+    line, pos = get_line_at(file, 0)
+    return line, file[pos::]
 
-    line = file.split("\n")[0]
-    remainder = file[len(line) + 1 : :]
-    line = remove_cmt_in_line(line)
+
+def get_line_at(file: str, pos: int):
+    """
+    Get the content of the line starting at offset pos without slicing the rest of the
+    file, so that a complete scan of the file stays linear in its length.
+
+    Args:
+        file (str): complete code file.
+        pos (int): offset of the first character of the line.
+
+    Returns:
+        line (str): the line starting at pos.
+        pos (int): offset of the next line, len(file) if the file is consumed.
+    """
+    end = file.find("\n", pos)
+    if end == -1:
+        return file[pos::], len(file)
+
+    line = remove_cmt_in_line(file[pos:end])
     line = line.strip()
-    return line, remainder
+    return line, end + 1
 
 
 def skip_line(line: str, cur_state):
@@ -134,6 +148,51 @@ def merge_line(line: str, pre_lines: list, indent: str):
     return line
 
 
+# logical line spanning the code lines first to last, the text is the merged code line
+# of state 0 (see skip_line), or the original line of the comment lines
+LogicalLine = namedtuple("LogicalLine", ["first", "last", "indent", "text", "state"])
+
+
+def generate_logical_lines(code_line: list):
+    """
+    Normalize the code lines into logical lines in one pass. The continuity lines are
+    merged into the line that completes them, and the comment lines in between belong
+    to the span of the merged line, so that the spans cover every code line once.
+
+    Args:
+        code_line (list): lines of the Matlab file.
+
+    Yields:
+        logical line (LogicalLine): span, indent, text and state of the logical line.
+    """
+    line_state = -1
+    cond_line_ind = []
+    for [ind, line] in enumerate(code_line):
+        line_state = skip_line(line, line_state)
+        if line_state == 4:
+            cond_line_ind.append(ind)
+        if line_state != 0:
+            if not cond_line_ind:
+                yield LogicalLine(ind, ind, "", line, line_state)
+            continue
+
+        # empty space to allow it align with the original code
+        _, n_empty = remove_empty_space_before_line(line)
+        empty_chars = " " * n_empty
+
+        # process the complete line
+        pre_lines = [remove_cmt_in_line(code_line[i]) for i in cond_line_ind]
+        text = merge_line(remove_cmt_in_line(line), pre_lines, empty_chars)
+        first = cond_line_ind[0] if cond_line_ind else ind
+        cond_line_ind = []
+        yield LogicalLine(first, ind, empty_chars, text, 0)
+
+    # the unfinished line at the end of the file
+    if cond_line_ind:
+        last = len(code_line) - 1
+        yield LogicalLine(cond_line_ind[0], last, "", code_line[last], 4)
+
+
 # parse the first code line and the rest of the file
 def parse_line(file: str):
     """
@@ -147,36 +206,155 @@ def parse_line(file: str):
         lines until it is unfinished.
         remainder (str): the rest of the file.
     """
+    content, pos = parse_line_at(file, 0)
+    return content, file[pos::]
+
+
+def parse_line_at(file: str, pos: int):
+    """
+    Parse the first code line starting at offset pos.
+
+    Args:
+        file (str): complete code file.
+        pos (int): offset to start parsing.
+
+    Returns:
+        line (str): the first code line from pos, the line is followed by the rest
+        lines until it is unfinished.
+        pos (int): offset of the rest of the file.
+    """
+    file_len = len(file)
+
+    def next_line():
+        nonlocal pos
+        line, pos = get_line_at(file, pos)
+        return line, pos == file_len
+
+    content = parse_code_line(next_line)
+    return content, pos
+
+
+def parse_code_line(next_line):
+    """
+    Parse the first code line from a source of lines.
+
+    Args:
+        next_line (callable): return the next line without comments and whether the
+        source is consumed.
+
+    Returns:
+        line (str): the first code line, the line is followed by the rest lines until
+        it is unfinished.
+    """
     content = ""
 
     # ignore the comments
-    line, file = get_line(file)
+    line, consumed = next_line()
     cmts = line == ""
     while cmts:
-        line, file = get_line(file)
+        line, consumed = next_line()
         cmts = line == ""
-        if line != "" or file == "":
+        if line != "" or consumed:
             break
 
     # get the first valid line
     cond = line[-3:] == "..."
     if not cond:
         content = line
-        return content, file
+        return content
 
     while cond:
         valid_line = line[:-3]
         content += " " + valid_line
-        line, file = get_line(file)
+        line, consumed = next_line()
         cond = line[-3:] == "..."
         if not cond:
             content = content + " " + line
             break
 
-    return content, file
+    return content
 
 
 def generate_valid_code_line(file: str):
-    while file != "":
-        line, file = parse_line(file)
+    """
+    Yield the code lines of the file with comments removed and continuity lines merged.
+    The file is scanned once by offset, so the cost is linear in the file length.
+    """
+    pos = 0
+    file_len = len(file)
+    while pos < file_len:
+        line, pos = parse_line_at(file, pos)
         yield line
+
+
+def generate_valid_code_line_stream(lines):
+    """
+    Yield the code lines with comments removed and continuity lines merged from an
+    iterable of lines that keep the line break, e.g. an opened file. The lines are read
+    only as far as the code lines are consumed.
+    """
+    lines = iter(lines)
+    pending = next(lines, None)
+
+    def next_line():
+        nonlocal pending
+        if pending is None:
+            return "", True
+        line, pending = pending, next(lines, None)
+        # the last line without line break is kept as it is, same as get_line
+        if line.endswith("\n"):
+            line = remove_cmt_in_line(line[:-1]).strip()
+        return line, pending is None
+
+    while pending is not None:
+        yield parse_code_line(next_line)
+
+
+def remove_cmt_paragraph_stream(lines):
+    """
+    Remove the comments enclosed in %{ and %} from an iterable of lines that keep the
+    line break, the result is the same as remove_cmt_paragraph on the whole content.
+
+    Args:
+        lines (iterable): input lines, e.g. an opened file.
+
+    Yields:
+        line (str): lines without the paragraph comments, keeping the line break.
+    """
+    buffer = ""
+    scan_ind = 0
+    cur_line = ""
+    for raw in lines:
+        buffer += raw
+        pos = 0
+        while True:
+            start = buffer.find("%{", pos)
+            if start == -1:
+                cur_line += buffer[pos:]
+                buffer = ""
+                break
+            stop = buffer.find("%}", max(start + 2, scan_ind))
+            if stop == -1:
+                # the paragraph comment is not closed yet, wait for more lines
+                cur_line += buffer[pos:start]
+                buffer = buffer[start:]
+                scan_ind = max(len(buffer) - 1, 2)
+                break
+            cur_line += buffer[pos:start]
+            pos = stop + 2
+            scan_ind = 0
+
+        if "\n" in cur_line:
+            complete_lines = cur_line.split("\n")
+            cur_line = complete_lines.pop()
+            for line in complete_lines:
+                yield line + "\n"
+
+    # the paragraph comment is never closed, keep it as the regular expression does
+    cur_line += buffer
+    complete_lines = cur_line.split("\n")
+    cur_line = complete_lines.pop()
+    for line in complete_lines:
+        yield line + "\n"
+    if cur_line:
+        yield cur_line
@@ -0,0 +1,203 @@
+# - parse_cache.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
+# - Provide a process-wide cache of the parse results of the Matlab files - - - - - - - #
+import os
+import glob
+import pickle
+import hashlib
+import warnings
+from utils.parser.line import (
+    generate_valid_code_line,
+    generate_logical_lines,
+    remove_cmt_paragraph,
+)
+
+
+class ParseCache:
+    """
+    ParseCache keeps the content of each Matlab file and the results parsed from it, so
+    that the different stages of the pipeline parse each file only once.
+
+    The entries are keyed on the file path. An entry is reused if the modification time
+    and size of the file are unchanged, or if the content hash is unchanged when the
+    file has only been touched.
+
+    If a cache directory is set, the persistent results are also stored on disk keyed
+    on the content hash of the file and the version of the parser, so that re-runs of
+    the pipeline skip parsing the unchanged files.
+    """
+
+    def __init__(self, cache_dir=None):
+        self._entries = {}
+        self.hits = {}
+        self.misses = {}
+        self.disk_hits = {}
+        self.cache_dir = None
+        if cache_dir:
+            self.set_cache_dir(cache_dir)
+
+    def set_cache_dir(self, cache_dir: str):
+        """Store the persistent parse results in cache_dir"""
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.parser_version = get_parser_version()
+
+    def _stamp(self, file_dir: str):
+        stat = os.stat(file_dir)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _get_entry(self, file_dir: str):
+        """
+        Get the cache entry of the file, reload the file if it has been changed.
+
+        Raises:
+            FileNotFoundError: If the file is not found
+        """
+        key = os.path.abspath(file_dir)
+        stamp = self._stamp(file_dir)
+        entry = self._entries.get(key)
+        if entry is not None and entry["stamp"] == stamp:
+            return entry
+
+        with open(file_dir, "r") as file:
+            # Read the contents of the file
+            file_contents = file.read()
+        digest = hashlib.sha1(file_contents.encode()).hexdigest()
+
+        if entry is not None and entry["hash"] == digest:
+            entry["stamp"] = stamp
+            return entry
+
+        entry = {"stamp": stamp, "hash": digest, "content": file_contents, "parsed": {}}
+        self._entries[key] = entry
+        return entry
+
+    def get(self, file_dir: str, kind: str, builder, persist=False):
+        """
+        Return the parse result of the file.
+
+        Args:
+            file_dir (str): path of the Matlab file.
+            kind (str): name of the parse result, e.g. "var_usage".
+            builder (callable): function that parses the file content into the result,
+                only called when the result is not cached.
+            persist (bool, optional): whether to store the result in the cache
+                directory. The result should only depend on the file content. Defaults
+                to False.
+
+        Returns:
+            the parse result returned by builder.
+        """
+        entry = self._get_entry(file_dir)
+        if kind in entry["parsed"]:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            return entry["parsed"][kind]
+
+        persist = persist and self.cache_dir is not None
+        if persist:
+            result = self._load(entry["hash"], kind)
+            if result is not None:
+                self.disk_hits[kind] = self.disk_hits.get(kind, 0) + 1
+                entry["parsed"][kind] = result
+                return result
+
+        self.misses[kind] = self.misses.get(kind, 0) + 1
+        result = builder(entry["content"])
+        entry["parsed"][kind] = result
+        if persist:
+            self._dump(entry["hash"], kind, result)
+        return result
+
+    def _cache_file(self, digest: str, kind: str):
+        return os.path.join(
+            self.cache_dir, digest[:2], f"{digest}_{kind}_{self.parser_version}.pkl"
+        )
+
+    def _load(self, digest: str, kind: str):
+        cache_file = self._cache_file(digest, kind)
+        if not os.path.isfile(cache_file):
+            return None
+        try:
+            with open(cache_file, "rb") as file:
+                return pickle.load(file)
+        except Exception:
+            # broken cache file, parse the file again
+            return None
+
+    def _dump(self, digest: str, kind: str, result):
+        cache_file = self._cache_file(digest, kind)
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # write to a temporary file first so that concurrent runs never read a
+        # partially written cache file
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, "wb") as file:
+                pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except (RecursionError, pickle.PicklingError) as e:
+            warnings.warn(f"Cannot store the parse result '{kind}' on disk: {e}")
+            if os.path.isfile(tmp_file):
+                os.remove(tmp_file)
+
+    def clear(self):
+        self._entries = {}
+        self.hits = {}
+        self.misses = {}
+        self.disk_hits = {}
+
+    def summary(self):
+        """Return the hit and miss count of each kind of parse result"""
+        summary = []
+        for kind in sorted(set(self.hits) | set(self.misses) | set(self.disk_hits)):
+            kind_summary = (
+                f"{kind}: {self.hits.get(kind, 0)} hits, "
+                f"{self.misses.get(kind, 0)} misses"
+            )
+            if self.cache_dir is not None:
+                kind_summary += f", {self.disk_hits.get(kind, 0)} disk hits"
+            summary.append(kind_summary)
+        return "Parse cache " + "; ".join(summary)
+
+
+def get_parser_version():
+    """
+    Return the hash of the parser source code, so that the results stored on disk are
+    invalidated once the parser is changed.
+    """
+    parser_dir = os.path.dirname(os.path.abspath(__file__))
+    source_files = sorted(glob.glob(os.path.join(parser_dir, "*.py")))
+    source_files.append(os.path.join(parser_dir, "..", "..", "function_tag.py"))
+
+    digest = hashlib.sha1()
+    for source_file in source_files:
+        if os.path.isfile(source_file):
+            with open(source_file, "rb") as file:
+                digest.update(file.read())
+    return digest.hexdigest()[:12]
+
+
+# the cache shared by all stages in the process
+PARSE_CACHE = ParseCache()
+
+
+def get_code_lines(file_dir: str):
+    """Return the lines of the file split by the line break"""
+    return PARSE_CACHE.get(file_dir, "code_line", lambda content: content.split("\n"))
+
+
+def get_logical_lines(file_dir: str):
+    """Return the logical lines of the file, see generate_logical_lines"""
+    return PARSE_CACHE.get(
+        file_dir,
+        "logical_line",
+        lambda _: list(generate_logical_lines(get_code_lines(file_dir))),
+    )
+
+
+def get_valid_code_lines(file_dir: str):
+    """Return the code lines of the file without comments and continuity lines"""
+    return PARSE_CACHE.get(
+        file_dir,
+        "valid_code_line",
+        lambda content: list(generate_valid_code_line(remove_cmt_paragraph(content))),
+        persist=True,
+    )
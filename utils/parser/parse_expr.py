@@ -1,6 +1,18 @@
 # - parse_expr.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
 # - Provide support functions that parse the matlab expression into AST - - - - - - - - #
 from utils.parser.expr_class import *
+from utils.parser.lexer import (
+    tokenize,
+    is_number_token,
+    IDENT,
+    NUMBER,
+    STRING,
+    OPERATOR,
+    OPEN,
+    CLOSE,
+    SPACE,
+    SEPARATOR,
+)
 
 
 # Matlab operators
@@ -31,16 +43,45 @@ BINARY_OPERATORS = [
 SINGLE_OPERATORS = [
     "~",
     "'",
-    ",'",
+    ".'",
     ":",  # consider slice operator : a special single operator
     ",",
 ]
 OPERATORS = SINGLE_OPERATORS + BINARY_OPERATORS
 
+# precedence levels of the operators from the lowest, following the Matlab operator
+# precedence, the "," separator binds the loosest and the struct operator the tightest
+PRECEDENCE_LEVELS = [
+    [","],
+    ["||"],
+    ["&&"],
+    ["|"],
+    ["&"],
+    [">", "<", ">=", "<=", "==", "~="],
+    [":"],
+    ["+", "-"],
+    ["*", "/", "\\", ".*", "./", ".\\"],
+    ["~"],  # unary prefix operators, including the unary minus and plus
+    ["^", ".^", "'", ".'"],
+    ["."],
+]
+OPERATOR_PRECEDENCE = {
+    op: level for level, ops in enumerate(PRECEDENCE_LEVELS, 1) for op in ops
+}
+PREFIX_OPERATORS = ["~", "-", "+"]
+POSTFIX_OPERATORS = ["'", ".'"]
+UNARY_PRECEDENCE = OPERATOR_PRECEDENCE["~"]
+# a.b.c is parsed as a.(b.c) so that the left operand is always the struct name
+RIGHT_ASSOCIATIVE = ["."]
+
+PAREN_TYPES = {"(": "()", "[": "[]", "{": "{}"}
+
 
 def is_numeric(s):
     """Deterimne whether the string expression is a numeric constant"""
     # exclude the special case of NAN
+    if is_number_token(s):
+        return True
     if s.upper() == "NAN":
         return False
     if s.isnumeric():
@@ -128,6 +169,11 @@ def parse_basic_computation(expr: str, table_vars={}):
     Parse the math computation into binary expression, including the binary operator,
     struct operator, etc.
 
+    The expression is parsed in one pass over its tokens by precedence climbing: an
+    operand is parsed first, then the operators binding at least as tight as the
+    current level are folded into the left operand. The unary operators are kept as
+    binary expressions with an empty operand, e.g. "~a" gives ("~", "", "a").
+
     Args:
         expr (str): input string that need to be parsed
         table_vars (dict, optional): Table of variable of current scope. Defaults to {}.
@@ -140,80 +186,122 @@ def parse_basic_computation(expr: str, table_vars={}):
         _BinaryExprAST_: the returned top level expression is a binary expression AST
     """
     # The binary expression is only considered appeared in rhs
-    cur_token = ""
-    for [ind, ch] in enumerate(expr):
-        if (cur_token + ch).isidentifier():
-            cur_token += ch
+    items = []
+    for token in tokenize(expr):
+        if token.kind == SPACE:
             continue
+        if token.kind == OPERATOR and token.text in OPERATOR_PRECEDENCE:
+            items.append(token.text)
+        elif token.kind == IDENT:
+            items.append(VariableExprAST(token.text, "#0"))
+        elif token.kind == NUMBER:
+            items.append(NumberExprAST(token.text))
+        elif token.kind == STRING:
+            # build the operand from the token, parse_base_expr would dispatch an
+            # unterminated string back to the binary expression
+            items.append(StringExprAST(token.text[1:-1]))
+        else:
+            raise ValueError(f"Cannot parse the binary expression '{expr}'")
 
-        if is_numeric(cur_token + ch):
-            cur_token += ch
-            continue
+    final_exprs = parse_operations(items, table_vars)
+    if len(final_exprs) != 1 or not isinstance(final_exprs[0], BinaryExprAST):
+        raise ValueError(f"Cannot parse the binary expression '{expr}'")
+    return final_exprs[0]
 
-        # handle the negative sign
-        if ch == "-" and cur_token == "" and is_numeric(ch + expr[ind + 1]):
-            cur_token += ch
-            continue
 
-        if (ch in OPERATORS) or (expr[ind : ind + 2] in BINARY_OPERATORS):
-            left_op = parse_base_expr(cur_token, table_vars, lhs=False)
-            if isinstance(left_op, VariableExprAST):
-                if ch != ".":  # struct operator
-                    left_op = table_vars[left_op.var_name]
-                else:  # normal binary operator
-                    left_op.notation = left_op.var_name
-
-            # first consider combined operators like .*
-            if expr[ind : ind + 2] in OPERATORS:
-                right_op = parse_base_expr(expr[ind + 2 :], table_vars, lhs=False)
-                op = expr[ind : ind + 2]
-            else:
-                right_op = parse_base_expr(expr[ind + 1 :], table_vars, lhs=False)
-                op = ch
+def is_operator_item(item):
+    """Determine whether the item of the operation sequence is an operator"""
+    return isinstance(item, str) and item in OPERATOR_PRECEDENCE
 
-            if isinstance(right_op, VariableExprAST):
-                if op != ".":
-                    right_op = table_vars[right_op.var_name]
-                else:
-                    # record the struct attribute
-                    right_op.notation = right_op.var_name
-            final_expr = BinaryExprAST(op, left_op, right_op)
 
-            # Append the usage to the variable
-            if isinstance(left_op, VariableExprAST):
-                left_op.mark_parent_AST(final_expr)
-            if isinstance(right_op, VariableExprAST):
-                right_op.mark_parent_AST(final_expr)
+def parse_operations(items: list, table_vars={}):
+    """
+    Parse the sequence of operands and operators into expressions by precedence
+    climbing: an operand is parsed first, then the operators binding at least as tight
+    as the current level are folded into the left operand. The unary operators are
+    kept as binary expressions with an empty operand, e.g. "~a" gives ("~", "", "a").
 
-            return final_expr
+    Args:
+        items (list): operators as strings and operands as ExprAST, or as the string
+            of an identifier or number, e.g. ["a", "+", CallExprAST].
+        table_vars (dict, optional): Table of variable of current scope. Defaults to {}.
 
-    raise ValueError(f"Cannot parse the binary expression '{expr}'")
+    Returns:
+        exprs (list): the parsed expressions, two operands without operator in between
+        start a new expression. An operand without operator is returned unchanged.
+    """
+    pos = 0
+
+    def peek_operator():
+        if pos < len(items) and is_operator_item(items[pos]):
+            return items[pos]
+        return None
+
+    def parse_operand():
+        nonlocal pos
+        if pos == len(items):
+            return ExprAST()
+        item = items[pos]
+        if is_operator_item(item):
+            if item not in PREFIX_OPERATORS:
+                # missing operand, e.g. the slice operator in x(:)
+                return ExprAST()
+            pos += 1
+            operand = parse_operation(UNARY_PRECEDENCE)
+            return combine_operands(item, ExprAST(), operand, table_vars)
+        pos += 1
+        return item
+
+    def parse_operation(min_precedence: int):
+        nonlocal pos
+        left_op = parse_operand()
+        while True:
+            op = peek_operator()
+            if op is None or OPERATOR_PRECEDENCE[op] < min_precedence:
+                return left_op
+            pos += 1
+            if op in POSTFIX_OPERATORS:
+                left_op = combine_operands(op, left_op, ExprAST(), table_vars)
+                continue
 
+            next_precedence = OPERATOR_PRECEDENCE[op]
+            if op not in RIGHT_ASSOCIATIVE:
+                next_precedence += 1
+            right_op = parse_operation(next_precedence)
+            left_op = combine_operands(op, left_op, right_op, table_vars)
 
-def parse_binary_expr(left_op, op, right_op, table_vars):
-    """Parse the binary expression
+    exprs = []
+    while pos < len(items):
+        exprs.append(parse_operation(0))
+    return exprs
 
-    Args:
-        left_op (ExprAST or str): left oeprator
-        op (str): binary operator string
-        right_op (ExprAST or str): right operator
-        table_vars (dict): Map table of variables in the current scope
 
-    Returns:
-        _type_: _description_
+def combine_operands(op: str, left_op: ExprAST, right_op: ExprAST, table_vars={}):
+    """
+    Combine the parsed operands with the operator into a binary expression, the
+    variables are mapped to the existed ones except the operands of the struct operator
+    which record the struct name and attribute.
     """
-    if not isinstance(left_op, ExprAST):
+    if isinstance(left_op, str):
         left_op = parse_base_expr(left_op, table_vars)
-        if isinstance(left_op, VariableExprAST):
+    if isinstance(right_op, str):
+        right_op = parse_base_expr(right_op, table_vars)
+
+    if isinstance(left_op, VariableExprAST):
+        if op != ".":  # normal binary operator
             left_op = map_variable(left_op, table_vars)
+        else:  # struct operator
+            left_op.notation = left_op.var_name
 
-    if not isinstance(right_op, ExprAST):
-        right_op = parse_base_expr(right_op)
-        if isinstance(right_op, VariableExprAST):
+    if isinstance(right_op, VariableExprAST):
+        if op != ".":
             right_op = map_variable(right_op, table_vars)
-
+        else:
+            # record the struct attribute
+            right_op.notation = right_op.var_name
     final_expr = BinaryExprAST(op, left_op, right_op)
 
+    # Append the usage to the variable
     if isinstance(left_op, VariableExprAST):
         left_op.mark_parent_AST(final_expr)
     if isinstance(right_op, VariableExprAST):
@@ -223,82 +311,56 @@ def parse_binary_expr(left_op, op, right_op, table_vars):
 
 
 def parse_nested_expr(nest_expr: str, table_vars={}, var_notation=0, lhs=False):
-    """Parse the nested expression, including the function call, slice expression, etc."""
+    """
+    Parse the nested expression, including the function call, slice expression, etc.
+    The expression is tokenized once, the tokens enclosed in each pair of brackets are
+    parsed when the bracket is closed and replaced by the parse result.
+    """
     expr_stack = []
-
-    pre_word = ""
     pos_bracket = []
-    # type_bracket includes {"()", "[]", "{}"}, non-detected parenthesis type at first
-    type_bracket = ["  "]
-
-    pre_paren_type = type_bracket[-1]
-    str_notation = False
+    # type_bracket includes {"()", "[]", "{}"} of the open brackets
+    type_bracket = []
 
-    for char in nest_expr:
+    for token in tokenize(nest_expr):
         # determine current parenthesis type
-        cur_paren_type = type_bracket[-1]
-
-        # determine whether the current word is a valid lexeme:
-        # identifier, number, binary operator, and string.
-        # if yes, update the pre_word and continue
-        if (pre_word + char).isidentifier():
-            pre_word = pre_word + char
-        elif is_numeric(pre_word + char):
-            pre_word = pre_word + char
-        elif pre_word + char in BINARY_OPERATORS:
-            pre_word = pre_word + char
-        elif str_notation:
-            pre_word = pre_word + char
-
-        elif char != " " or (char == " " and cur_paren_type == "[]"):
-            # pre_word is a lexeme unit, push it to the stack
-            if pre_word != pre_paren_type[1] and pre_word != "":
-                expr_stack.append(pre_word)
-
-            # open parenthesis: push the current parenthesis type to the stack
-            if char in ["(", "[", "{"]:
-                pos_bracket.append(len(expr_stack))
-                if char == "(":
-                    cur_paren_type = "()"
-                elif char == "[":
-                    cur_paren_type = "[]"
-                elif char == "{":
-                    cur_paren_type = "{}"
-                type_bracket.append(cur_paren_type)
-
-            # close parenthesis: parse the non-nested expression
-            # pop the current parenthesis type from the stack
-            if char == cur_paren_type[1]:
-                expr = expr_stack[pos_bracket[-1] :] + [cur_paren_type[1]]
-                # parse the non-nested expression
-                expr_AST = parse_paren_expr(
-                    expr, table_vars, cur_paren_type, var_notation, lhs
-                )
-                expr_AST.append(cur_paren_type)
-
-                # pop current parsed expression
-                expr_stack = expr_stack[: pos_bracket[-1]]
-                expr_stack.append(expr_AST)
-                pre_paren_type = type_bracket[-1]
-                pos_bracket.pop()
-                type_bracket.pop()
-
-            pre_word = char
-
-        # determine whether is string by the quotation mark
-        if char == '"' or (
-            char == "'"
-            and len(expr_stack) > 0
-            and (
-                (isinstance(expr_stack[-1], str) and expr_stack[-1] not in table_vars)
-                or (isinstance(expr_stack[-1], ExprAST))
-                or (isinstance(expr_stack[-1], list))
+        cur_paren_type = type_bracket[-1] if type_bracket else "  "
+
+        if token.kind == SPACE:
+            continue
+        # the space separating the elements in the concatenation
+        if token.kind == SEPARATOR:
+            expr_stack.append(",")
+            continue
+
+        # open parenthesis: push the current parenthesis type to the stack
+        if token.kind == OPEN:
+            pos_bracket.append(len(expr_stack))
+            type_bracket.append(PAREN_TYPES[token.text])
+            expr_stack.append(token.text)
+            continue
+
+        # close parenthesis: parse the non-nested expression
+        # pop the current parenthesis type from the stack
+        if token.kind == CLOSE:
+            if token.text != cur_paren_type[1]:
+                # ignore the unmatched parenthesis
+                continue
+            expr = expr_stack[pos_bracket[-1] :] + [cur_paren_type[1]]
+            # parse the non-nested expression
+            expr_AST = parse_paren_expr(
+                expr, table_vars, cur_paren_type, var_notation, lhs
             )
-        ):
-            str_notation = not str_notation
+            expr_AST.append(cur_paren_type)
 
-    if not pre_word in [")", "}", "]", ";"]:
-        expr_stack.append(pre_word)
+            # pop current parsed expression
+            del expr_stack[pos_bracket[-1] :]
+            expr_stack.append(expr_AST)
+            pos_bracket.pop()
+            type_bracket.pop()
+            continue
+
+        # identifier, number, operator and string are lexeme units
+        expr_stack.append(token.text)
 
     # parse the final non-nested expression
     final_call = get_args_from_lexical(expr_stack, table_vars, lhs=lhs)
@@ -310,102 +372,55 @@ def get_args_from_lexical(lex_list: list, table_vars={}, var_list=[], lhs=False)
     Get the arguments from the lexical list which is the list of string that consists of
     basic expression, e.g. identifier, number, etc. or expression AST.
 
+    The parsed bracket groups are first combined with the preceding identifier into
+    one operand, a call, slice or cell, then the arguments separated by "," or ";" are
+    parsed by precedence climbing, see parse_operations.
+
     Args:
-        lex_list (list): lexical list
-        paren_type (str, optional): parenthesis type, e.g. (), []. Defaults to "()".
-    """
+        lex_list (list): lexical list, the bracket groups are the list of their parsed
+            arguments followed by the parenthesis type, e.g. [arg1, arg2, "()"].
+        table_vars (dict, optional): Table of variable of current scope. Defaults to {}.
+        var_list (list, optional): variables of the scope notating the cells.
+            Defaults to [].
+        lhs(bool, optional): whether the expression is in the lhs. Defaults to False.
 
-    # concatenate the arguments to parse
-    args = []
-    arg = ""
-    skip_flag = False
-    for ind, lex in enumerate(lex_list):
-        if skip_flag:
-            skip_flag = False
+    Returns:
+        args (list): parsed arguments, ExprAST or the string of a single lexeme.
+    """
+    operands = []
+    for lex in lex_list:
+        if not isinstance(lex, list):
+            operands.append(lex)
             continue
-        if (
-            isinstance(lex, str)
-            and ind < len(lex_list) - 1
-            and isinstance(lex_list[ind + 1], str)
-            and (lex_list[ind : ind + 2] in BINARY_OPERATORS)
-        ):
-            # is a two-symbol binary operator, combine with the next argument
-            arg = parse_binary_expr(
-                args[ind - 1],
-                "".join(lex_list[ind : ind + 2]),
-                get_args_from_lexical(lex_list[ind + 1])[0],
-                table_vars,
-            )
-            args.pop()
-            args.append(arg)
-            skip_flag = True
-        elif isinstance(lex, str) and (lex in BINARY_OPERATORS):
-            # if a negative sign
-            if len(args) < 1 and lex == "-":
-                arg = parse_binary_expr(
-                    NumberExprAST("0"),
-                    "-",
-                    get_args_from_lexical(lex_list[ind + 1 : ind + 2])[0],
-                    table_vars,
-                )
-                args.append(arg)
-                skip_flag = True
-            else:
-                # combine the binary operation to the latter argument
-                arg = parse_binary_expr(
-                    args[-1],
-                    lex,
-                    get_args_from_lexical(lex_list[ind + 1 : ind + 2])[0],
-                    table_vars,
-                )
-                args.pop()
-                args.append(arg)
-                skip_flag = True
-        elif isinstance(lex, list):
-            # if is a list, consider combining with the previous lexis
-            if len(args) < 1:
-                concat_expr = ConcatExprAST(lex)
-                args.append(concat_expr)
-                continue
-
-            # empty in bracket
-            if len(lex) == 1:
-                args.append(ExprAST())
-                continue
 
-            last_arg = args[-1]
-            lex, paren_type = lex[:-1], lex[-1]
-
-            if lhs or last_arg in table_vars:
-                slicer = ""
-                for ind in range(len(lex)):
-                    slicer += lex[ind].get_content()
-
-                if lhs:
-                    slice_expr = SliceExprAST(
-                        VariableExprAST(last_arg), StringExprAST(slicer)
-                    )
-                else:
-                    slice_expr = SliceExprAST(
-                        table_vars[last_arg], StringExprAST(slicer)
-                    )
-                args.pop()
-                args.append(slice_expr)
-            elif isinstance(last_arg, str) and last_arg.isidentifier():
-                if paren_type == "()":
-                    call_expr = CallExprAST(last_arg, lex)
-                    args.pop()
-                    args.append(call_expr)
-                elif paren_type == "{}":
-                    cell_expr = CellExprAST(last_arg, "#" + str(len(var_list)), 0, lex)
-                    args.pop()
-                    args.append(cell_expr)
+        lex, paren_type = lex[:-1], lex[-1]
+        last_arg = operands[-1] if operands else None
+        is_name = isinstance(last_arg, str) and last_arg.isidentifier()
+        if is_name and (lhs or last_arg in table_vars):
+            slicer = "".join(arg.get_content() for arg in lex)
+            if lhs:
+                slice_var = VariableExprAST(last_arg)
             else:
-                concat_expr = ConcatExprAST(lex)
-                args.append(concat_expr)
-        elif lex != "," and lex != ";":
-            args.append(lex)
+                slice_var = table_vars[last_arg]
+            operands[-1] = SliceExprAST(slice_var, StringExprAST(slicer))
+        elif is_name and paren_type == "()":
+            operands[-1] = CallExprAST(last_arg, lex)
+        elif is_name and paren_type == "{}":
+            operands[-1] = CellExprAST(last_arg, "#" + str(len(var_list)), 0, lex)
+        elif paren_type == "()" and len(lex) == 1:
+            # parenthesized expression
+            operands.append(lex[0])
+        else:
+            operands.append(ConcatExprAST(lex))
 
+    args = []
+    items = []
+    for operand in operands + [","]:
+        if isinstance(operand, str) and operand in [",", ";"]:
+            args.extend(parse_operations(items, table_vars))
+            items = []
+        else:
+            items.append(operand)
     return args
 
 
@@ -584,27 +599,52 @@ def parse_ForLoopAST(
     Parse the for loop expression
     """
     loop_varname = expr.split("=")[0].strip("for ")
-    loop_range = expr.split("=")[1].split(":")
+    loop_range = split_range(expr.split("=", 1)[1])
 
     loop_var = VariableExprAST(loop_varname, "#" + str(len(variable_list)))
-    if len(loop_range) > 1:
+    if len(loop_range) == 3:
+        loop_start = parse_base_expr(loop_range[0], table_vars)
+        loop_step = parse_base_expr(loop_range[1], table_vars)
+        loop_end = parse_base_expr(loop_range[2], table_vars)
+        loop_for_block = ForLoopAST(loop_var, loop_start, loop_end, [], loop_step)
+    elif len(loop_range) == 2:
         loop_start = parse_base_expr(loop_range[0], table_vars)
         loop_end = parse_base_expr(loop_range[1], table_vars)
         loop_for_block = ForLoopAST(loop_var, loop_start, loop_end)
     else:
         loop_start = parse_base_expr(loop_range[0], table_vars)
         loop_for_block = ForLoopAST(loop_var, loop_start, loop_start)
+    loop_for_block.set_block(cur_block)
     loop_var.set_block(loop_for_block)
     variable_list.append(loop_var)
     table_vars[loop_varname] = loop_var
     return loop_for_block, variable_list, table_vars
 
 
+def split_range(expr: str):
+    """Split the range start:end or start:step:end at the top level colons"""
+    parts = []
+    depth = 0
+    begin = 0
+    for token in tokenize(expr):
+        if token.kind == OPEN:
+            depth += 1
+        elif token.kind == CLOSE:
+            depth -= 1
+        elif token.kind == OPERATOR and token.text == ":" and depth == 0:
+            parts.append(expr[begin : token.start])
+            begin = token.end
+    parts.append(expr[begin:])
+    # keep the whole expression if it is not a range, e.g. "a:b:c:d"
+    return parts if len(parts) <= 3 else [expr]
+
+
 def parse_WhileLoopAST(
     expr: str, variable_list=[], table_vars: dict = {}, cur_block: BlockAST = None
 ):
     loop_cond = parse_base_expr(expr.split("while")[1], table_vars)
     loop_expr = WhileLoopAST(loop_cond, [])
+    loop_expr.set_block(cur_block)
     return loop_expr, variable_list, table_vars
 
 
@@ -1,13 +1,10 @@
 # - var_usage_analysis.py - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - #
 # - Parse the Matlab code and generate the variable usage table for analysis - - - - - -#
-import re
+import math
+from collections import Counter
 from function_tag import get_function_attributes
-from utils.parser.line import (
-    remove_cmt_in_line,
-    remove_empty_space_before_line,
-    skip_line,
-    merge_line,
-)
+from utils.parser.parse_cache import PARSE_CACHE, get_logical_lines
+from utils.parser.lexer import IDENT, tokenize, split_assignment
 from utils.parser.parse_expr import (
     map_variable,
     parse_base_expr,
@@ -27,11 +24,172 @@ from utils.parser.expr_class import (
     ConcatExprAST,
     BinaryExprAST,
     CallExprAST,
+    NumberExprAST,
+    ForLoopAST,
+    WhileLoopAST,
 )
 
 CONTROL_CLAUSE = ["for", "while", "if", "elseif", "else", "switch", "case", "try"]
 
 
+class DefUseIndex:
+    """
+    Def-use index of the variables of a block, built once the block is parsed. The
+    production expressions map to the output variables they define, e.g. the outputs
+    of one function call, so that a variable is used if one of them is used.
+    Given the logical lines of the block, the variables produced in a loop are indexed
+    as loop invariant if their value is the same at every iteration, or as loop
+    indexed by the loop variable if it only depends on the iteration.
+    """
+
+    def __init__(self, var_list: list, logical_lines: list = None):
+        # production expression -> output variables
+        self.outputs = {}
+        for var in var_list:
+            for expr in var.production.values():
+                self.outputs.setdefault(expr, []).append(var)
+
+        # production expressions of which at least one output variable is used
+        self.used_productions = set()
+        for expr, out_vars in self.outputs.items():
+            if any(len(var.usage) != 0 for var in out_vars):
+                self.used_productions.add(expr)
+
+        self.loop_invariant = set()
+        self.loop_indexed = {}
+        if logical_lines is not None:
+            self.loop_invariant, self.loop_indexed = find_loop_vars(
+                var_list, logical_lines
+            )
+
+    def is_used(self, var: VariableExprAST):
+        """Determine whether the variable or another output of its production is used"""
+        if len(var.usage) != 0:
+            return True
+        return any(expr in self.used_productions for expr in var.production.values())
+
+    def is_loop_invariant(self, var: VariableExprAST):
+        """Determine whether the variable is produced in a loop but loop invariant"""
+        return var in self.loop_invariant
+
+    def get_loop_index(self, var: VariableExprAST):
+        """Return the loop variable indexing the variable, None if not loop indexed"""
+        return self.loop_indexed.get(var)
+
+    def get_save_count(self, var: VariableExprAST):
+        """
+        Return the number of values saved for the variable: the iterations of the loop
+        indexing it, 1 if not loop indexed, None if the iterations are unknown.
+        """
+        if var not in self.loop_indexed:
+            return 1
+        return get_loop_count(get_enclosing_loops(var.block)[0])
+
+
+def get_enclosing_loops(block: BlockAST):
+    """Return the for and while loops enclosing the block, from the innermost"""
+    loops = []
+    while block is not None:
+        if isinstance(block, (ForLoopAST, WhileLoopAST)):
+            loops.append(block)
+        block = getattr(block, "block", None)
+    return loops
+
+
+def get_rhs_names(line: str):
+    """Return the identifiers of the right hand side of the assignment, None if no"""
+    result = split_assignment(line)
+    if result is None:
+        return None
+    return {token.text for token in tokenize(result[1]) if token.kind == IDENT}
+
+
+def is_positive_int(expr: ExprAST):
+    """Determine whether the expression is a positive integer constant"""
+    return isinstance(expr, NumberExprAST) and expr.value >= 1 and expr.value % 1 == 0
+
+
+def is_index_range(loop: ForLoopAST):
+    """
+    Determine whether the for loop only iterates over positive integers: the start
+    is a positive integer and the step, if any, is a positive integer, e.g. "1:nch"
+    or "1:2:nch" but not "1:0.5:3".
+    """
+    if not is_positive_int(getattr(loop, "start", None)):
+        return False
+    return loop.step is None or is_positive_int(loop.step)
+
+
+def get_loop_count(loop: ForLoopAST):
+    """Return the number of iterations of the for loop, None if not constant"""
+    bounds = [loop.start, loop.end] + ([] if loop.step is None else [loop.step])
+    if not all(isinstance(expr, NumberExprAST) for expr in bounds):
+        return None
+    step = 1 if loop.step is None else loop.step.value
+    if step == 0:
+        return 0
+    return max(math.floor((loop.end.value - loop.start.value) / step) + 1, 0)
+
+
+def find_loop_vars(var_list: list, logical_lines: list):
+    """
+    Find the variables produced in a loop that can be cached:
+    - loop invariant, the value does not change between the iterations: no identifier
+      of the right hand side is assigned in the outermost enclosing loop, the loop
+      variables included.
+    - loop indexed, the value only depends on the iteration: the variable is in one
+      for loop over positive integers, see is_index_range, and the loop variable
+      is the only identifier of the right hand side assigned in the loop.
+    Both are only assigned once in the loop. The right hand side is read from the
+    code as the parsed expressions drop the slices, e.g. x(:, ch) is parsed as x.
+
+    Args:
+        var_list (list): variables of the block.
+        logical_lines (list): logical lines of the Matlab file.
+
+    Returns:
+        loop_invariant (set): the loop invariant variables.
+        loop_indexed (dict): loop indexed variable : name of the loop variable.
+    """
+    code_text = {line.last: line.text for line in logical_lines if line.state == 0}
+
+    # loop : number of assignments of each variable name in the loop
+    loop_assigned = {}
+    for var in var_list:
+        for loop in get_enclosing_loops(getattr(var, "block", None)):
+            loop_assigned.setdefault(loop, Counter())[var.var_name] += 1
+
+    loop_invariant = set()
+    loop_indexed = {}
+    for var in var_list:
+        if not var.in_loop:
+            continue
+        loops = get_enclosing_loops(getattr(var, "block", None))
+        if len(loops) == 0:
+            continue
+        assigned = loop_assigned[loops[-1]]
+        if assigned[var.var_name] != 1:
+            continue
+
+        rhs_names = get_rhs_names(code_text.get(var.get_attr("line"), ""))
+        if rhs_names is None:
+            continue
+        loop_dependence = {name for name in rhs_names if assigned[name] != 0}
+        if len(loop_dependence) == 0:
+            loop_invariant.add(var)
+            continue
+
+        loop = loops[0]
+        if len(loops) != 1 or not isinstance(loop, ForLoopAST):
+            continue
+        loop_var = loop.var.var_name
+        # the loop variable is only assigned by the loop
+        if loop_dependence == {loop_var} and assigned[loop_var] == 1:
+            if is_index_range(loop):
+                loop_indexed[var] = loop_var
+    return loop_invariant, loop_indexed
+
+
 def initialize_var_table(reserve_word: list[str]):
     var_dict = {}
     var_list = []
@@ -174,11 +332,11 @@ def parse_primary_expr(
     if expr.split(" ")[0] in CONTROL_CLAUSE or expr.split("(")[0] in CONTROL_CLAUSE:
         return parse_ctrl_clause(expr, variable_list, table_vars, cur_block)
 
-    # RE split "=" for assignment but not split "==", ">=" , "<=" and "~="
-    result = re.split(r"(?<=[^<>=~])=(?![<>=~])", expr)
+    # split "=" for assignment but not "==", ">=" , "<=", "~=" and "=" in strings
+    result = split_assignment(expr)
 
     # If it is a statement without "=", return root expression to notate no assignment
-    if len(result) < 2:
+    if result is None:
         return ExprAST(expr), variable_list, table_vars
 
     # parse the left and right hand side of the expression
@@ -202,39 +360,44 @@ def analyze_var_usage(
     func_dir: str,
     #   , call_pattern: dict, func_name: str
 ):
+    """
+    Analyze the variable usage of the Matlab file, the result is parsed once and shared
+    by all the stages through the parse cache.
+    """
     try:
-        with open(func_dir, "r") as file:
-            # Read the contents of the file
-            file_contents = file.read()
+        return PARSE_CACHE.get(
+            func_dir,
+            "var_usage",
+            lambda _: analyze_logical_lines(get_logical_lines(func_dir)),
+            persist=True,
+        )
     except FileNotFoundError:
         raise ValueError(f"The file '{func_dir}' was not found.")
 
-    code_line = file_contents.split("\n")
-    line_state = -1
-    cond_line_ind = []
 
+def analyze_logical_lines(logical_lines):
+    """
+    Analyze the variable usage of the logical lines of the Matlab file
+
+    Args:
+        logical_lines (list): logical lines of the Matlab file
+
+    Returns:
+        top_var_list (dict): block : variable list of the block
+        top_expr (list): expressions that are not attached to any block
+        def_use (dict): block : def-use index of the variables of the block
+    """
     AST_nodes = []
     top_var_list = {}
     top_expr = []
 
     # create variable tables to record the variable usage
     table_vars, variable_list = initialize_var_table(["nargin", "pi", "exp"])
-    for [ind, line] in enumerate(code_line):
+    for logical_line in logical_lines:
         # skip the comment line
-        line_state = skip_line(line, line_state)
-        if line_state == 4:
-            cond_line_ind.append(ind)
-        if line_state != 0:
+        if logical_line.state != 0:
             continue
-
-        # empty space to allow it align with the original code
-        _, n_empty = remove_empty_space_before_line(line)
-        empty_chars = " " * n_empty
-
-        # process the complete line
-        pre_lines = [remove_cmt_in_line(code_line[i]) for i in cond_line_ind]
-        line = merge_line(remove_cmt_in_line(line), pre_lines, empty_chars)
-        cond_line_ind = []
+        ind, line = logical_line.last, logical_line.text
 
         cur_block = AST_nodes[-1] if len(AST_nodes) else BlockAST([])
 
@@ -270,4 +433,9 @@ def analyze_var_usage(
     # function declaration
     if len(AST_nodes) > 0 and (AST_nodes[-1] not in top_var_list):
         top_var_list[AST_nodes[-1]] = variable_list
-    return top_var_list, top_expr
+
+    def_use = {
+        block: DefUseIndex(var_list, logical_lines)
+        for block, var_list in top_var_list.items()
+    }
+    return top_var_list, top_expr, def_use
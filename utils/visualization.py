@@ -2,14 +2,21 @@ from graphviz import Digraph
 from parse import parse
 
 
-def traverse_call_graph(node, graph, simplify=True):
+def traverse_call_graph(node, graph, simplify=True, visited=None):
+    # draw the node shared by several parents or in a cycle once
+    if visited is None:
+        visited = set()
+    if node.func_name in visited:
+        return
+    visited.add(node.func_name)
+
     if simplify:
         graph.node(node.func_name, shape="point")
     else:
         graph.node(node.func_name, node.func_name)
-    for child in node.child_nodes:
+    for child in node.child_nodes.values():
         graph.edge(node.func_name, child.func_name, arrowsize="0.3")
-        traverse_call_graph(child, graph, simplify=simplify)
+        traverse_call_graph(child, graph, simplify=simplify, visited=visited)
 
 
 def call_graph_viz(root_node, visual_method, graph_name="call_graph"):